@@ -3,11 +3,38 @@
 Analyze 2024 temp data and create a matching 2023 dataset with similar size and location distribution.
 """
 
-import csv
 import os
-import random
 from collections import defaultdict
 
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from parquet_cache import read_cached
+
+# Matching radius: 0.15 degree of great-circle arc, expressed as the equivalent
+# straight-line (chord) distance between points on the unit sphere
+MATCH_RADIUS_DEG = 0.15
+MATCH_RADIUS_CHORD = 2 * np.sin(np.radians(MATCH_RADIUS_DEG) / 2)
+
+def to_unit_vectors(locations):
+    """Convert an (N, 2) array of (lat, lon) degrees to (N, 3) points on the unit sphere."""
+    lat = np.radians(locations[:, 0])
+    lon = np.radians(locations[:, 1])
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+TEMP_GRID_DTYPES = {'date': str, 'lat': 'float32', 'lon': 'float32', 'temp_c': 'float32'}
+
+def read_temp_grid(csv_path, columns=None):
+    """
+    Load a temperature grid CSV, caching the parsed table as a Parquet file next to it
+    (see parquet_cache.py).
+    """
+    return read_cached(
+        csv_path, lambda path: pd.read_csv(path, usecols=list(TEMP_GRID_DTYPES), dtype=TEMP_GRID_DTYPES), columns
+    )
+
 def analyze_2024_data():
     """Analyze the 2024 temperature data structure."""
     data_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,26 +42,23 @@ def analyze_2024_data():
     
     print("Analyzing 2024 temperature data...")
     
-    locations = set()  # Unique (lat, lon) pairs
-    dates = set()  # Unique dates
-    location_date_counts = defaultdict(int)  # Count per location-date combination
-    total_rows = 0
-    
-    with open(file_2024, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        
-        for row in reader:
-            lat = float(row['lat'])
-            lon = float(row['lon'])
-            date = row['date']
-            
-            locations.add((lat, lon))
-            dates.add(date)
-            location_date_counts[(lat, lon, date)] += 1
-            total_rows += 1
-            
-            if total_rows % 500000 == 0:
-                print(f"  Processed {total_rows:,} rows...")
+    df = read_temp_grid(file_2024, columns=['date', 'lat', 'lon'])
+    total_rows = len(df)
+    
+    # Flat columns: float32 lat/lon and dates encoded as uint32 ids into the sorted unique dates
+    lat = df['lat'].to_numpy()
+    lon = df['lon'].to_numpy()
+    date_ids, dates = pd.factorize(df['date'], sort=True)
+    
+    # Unique (lat, lon) pairs
+    locations = np.unique(np.column_stack([lat, lon]), axis=0)
+    
+    # Count per location-date combination
+    keys = np.empty(total_rows, dtype=[('lat', np.float32), ('lon', np.float32), ('date', np.uint32)])
+    keys['lat'] = lat
+    keys['lon'] = lon
+    keys['date'] = date_ids
+    location_date_counts = np.unique(keys, return_counts=True)
     
     print(f"\n2024 Data Analysis:")
     print(f"  Total rows: {total_rows:,}")
@@ -46,11 +70,10 @@ def analyze_2024_data():
     lat_distribution = defaultdict(int)
     lon_distribution = defaultdict(int)
     
-    for lat, lon in locations:
-        # Round to 1 decimal for distribution analysis
-        lat_rounded = round(lat, 1)
-        lon_rounded = round(lon, 1)
+    # Round to 1 decimal for distribution analysis
+    for lat_rounded in np.round(locations[:, 0].astype(np.float64), 1).tolist():
         lat_distribution[lat_rounded] += 1
+    for lon_rounded in np.round(locations[:, 1].astype(np.float64), 1).tolist():
         lon_distribution[lon_rounded] += 1
     
     print(f"\nLocation Distribution:")
@@ -66,7 +89,7 @@ def analyze_2024_data():
         'lon_distribution': lon_distribution
     }
 
-def create_matching_2023_data(analysis_2024):
+def create_matching_2023_data(analysis_2024, rng):
     """Create a 2023 dataset matching 2024's size and location distribution."""
     data_dir = os.path.dirname(os.path.abspath(__file__))
     file_2023_full = os.path.join(data_dir, 'temp_grid_daily_2023.csv')
@@ -78,22 +101,13 @@ def create_matching_2023_data(analysis_2024):
     
     # Build index of 2023 data by location
     print("\nIndexing 2023 data by location...")
-    data_by_location = defaultdict(list)  # {(lat, lon): [rows]}
-    
-    with open(file_2023_full, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        
-        rows_indexed = 0
-        for row in reader:
-            lat = float(row['lat'])
-            lon = float(row['lon'])
-            # Round to match 2024 precision (or use exact match)
-            location_key = (round(lat, 2), round(lon, 2))  # Round to 2 decimals for matching
-            data_by_location[location_key].append(row)
-            rows_indexed += 1
-            
-            if rows_indexed % 5000000 == 0:
-                print(f"  Indexed {rows_indexed:,} rows...")
+    df_2023 = read_temp_grid(file_2023_full)
+    rows_indexed = len(df_2023)
+    
+    # Round to 2 decimals for matching 2024 precision; {(lat, lon): row positions}
+    lat_key = np.round(df_2023['lat'].to_numpy(dtype=np.float64), 2)
+    lon_key = np.round(df_2023['lon'].to_numpy(dtype=np.float64), 2)
+    data_by_location = pd.DataFrame({'lat': lat_key, 'lon': lon_key}).groupby(['lat', 'lon'], sort=False).indices
     
     print(f"  Total 2023 rows indexed: {rows_indexed:,}")
     print(f"  Unique locations in 2023: {len(data_by_location):,}")
@@ -102,43 +116,43 @@ def create_matching_2023_data(analysis_2024):
     print("\nMatching locations and sampling data...")
     
     # Convert 2024 locations to rounded keys for matching
-    target_locations_rounded = {(round(lat, 2), round(lon, 2)) for lat, lon in analysis_2024['locations']}
-    
-    # Find matching locations in 2023
-    matched_locations = {}
-    for loc_2024 in target_locations_rounded:
-        # Try exact match first
-        if loc_2024 in data_by_location:
-            matched_locations[loc_2024] = loc_2024
-        else:
-            # Try to find closest match (within 0.1 degree)
-            best_match = None
-            min_distance = float('inf')
-            for loc_2023 in data_by_location.keys():
-                distance = ((loc_2023[0] - loc_2024[0])**2 + (loc_2023[1] - loc_2024[1])**2)**0.5
-                if distance < min_distance and distance < 0.15:  # Within ~0.1 degree
-                    min_distance = distance
-                    best_match = loc_2023
-            if best_match:
-                matched_locations[loc_2024] = best_match
+    target_locations_rounded = set(map(tuple, np.round(analysis_2024['locations'].astype(np.float64), 2).tolist()))
+    
+    # Find closest match in 2023 (exact match or within 0.15 degree great-circle distance).
+    # Chord length on the unit sphere is monotonic in arc length, so a Euclidean
+    # kd-tree over 3D unit vectors gives true spherical nearest neighbours.
+    # Both grids are rounded to 2 decimals, so most targets are exact hits in the
+    # location index; only the remainder needs a neighbour search.
+    matched_locations = {loc: loc for loc in target_locations_rounded if loc in data_by_location}
+    unmatched = [loc for loc in target_locations_rounded if loc not in matched_locations]
+    
+    if unmatched:
+        keys_2023 = list(data_by_location.keys())
+        tree = cKDTree(to_unit_vectors(np.array(keys_2023)))
+        distances, indices = tree.query(to_unit_vectors(np.array(unmatched)), k=1,
+                                        distance_upper_bound=MATCH_RADIUS_CHORD)
+        for loc_2024, distance, index in zip(unmatched, distances.tolist(), indices.tolist()):
+            if distance < MATCH_RADIUS_CHORD:
+                matched_locations[loc_2024] = keys_2023[index]
     
     print(f"  Matched {len(matched_locations):,} locations ({len(matched_locations)/len(target_locations_rounded)*100:.1f}%)")
     
     # Sample data to match 2024 size
     print("\nSampling data to match target size...")
     
-    # Get all available data from matched locations
-    available_data = []
-    for loc_2024, loc_2023 in matched_locations.items():
-        available_data.extend(data_by_location[loc_2023])
+    # Get row positions of all available data from matched locations
+    available_data = np.concatenate(
+        [data_by_location[loc_2023] for loc_2023 in matched_locations.values()]
+        or [np.empty(0, dtype=np.intp)]
+    )
     
     print(f"  Available rows from matched locations: {len(available_data):,}")
     
     # Sample to match target size
     target_size = analysis_2024['total_rows']
     if len(available_data) >= target_size:
-        # Randomly sample
-        sampled_data = random.sample(available_data, target_size)
+        # Randomly sample positions into the pool rather than copying it
+        sampled_data = available_data[rng.choice(len(available_data), size=target_size, replace=False)]
     else:
         # Use all available data (might be less than target)
         sampled_data = available_data
@@ -146,12 +160,7 @@ def create_matching_2023_data(analysis_2024):
     
     # Write sampled data
     print(f"\nWriting matched 2023 dataset...")
-    with open(file_2023_matched, 'w', encoding='utf-8', newline='') as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(['date', 'lat', 'lon', 'temp_c'])
-        
-        for row in sampled_data:
-            writer.writerow([row['date'], row['lat'], row['lon'], row['temp_c']])
+    df_2023.iloc[sampled_data].to_csv(file_2023_matched, columns=['date', 'lat', 'lon', 'temp_c'], index=False)
     
     print(f"  Created: {file_2023_matched}")
     print(f"  Rows written: {len(sampled_data):,}")
@@ -160,13 +169,13 @@ def create_matching_2023_data(analysis_2024):
 
 def main():
     # Set random seed for reproducibility
-    random.seed(42)
+    rng = np.random.default_rng(42)
     
     # Analyze 2024 data
     analysis_2024 = analyze_2024_data()
     
     # Create matching 2023 dataset
-    create_matching_2023_data(analysis_2024)
+    create_matching_2023_data(analysis_2024, rng)
     
     print("\nDone!")
 
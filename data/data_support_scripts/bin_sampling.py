@@ -0,0 +1,17 @@
+"""
+Stratified sampling helpers shared by the reduce_* scripts.
+Rows are grouped into spatial-temporal bins and sampled evenly within each bin.
+"""
+
+import numpy as np
+
+
+def rank_within_bins(bin_ids, rng):
+    """Return each row's position in a random ordering of its bin."""
+    bin_sizes = np.bincount(bin_ids)
+    bin_starts = np.cumsum(bin_sizes) - bin_sizes
+    # Sort rows by bin, with a random key breaking ties inside each bin
+    order = np.lexsort((rng.random(len(bin_ids)), bin_ids))
+    ranks = np.empty(len(bin_ids), dtype=np.int64)
+    ranks[order] = np.arange(len(bin_ids)) - bin_starts[bin_ids[order]]
+    return ranks, bin_sizes
@@ -5,12 +5,18 @@ Creates smaller JSON files with data averaged by day-of-year across 2023-2024.
 These files are much smaller and faster to load in visualizations.
 """
 
-import json
-import csv
+import math
+import os
 from pathlib import Path
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Any
 
+import numpy as np
+import orjson
+import pandas as pd
+
+from parquet_cache import load_combined_observations, object_values
+
 # Species to process
 SPECIES = ['barswa', 'cangoo', 'sancra', 'redkno', 'spwduc', 'westan', 'gresni']
 
@@ -24,6 +30,50 @@ SPECIES_NAMES = {
     'gresni': 'Great Snipe'
 }
 
+# Rows per chunk when streaming the temperature CSV
+TEMPERATURE_CHUNK_ROWS = 5_000_000
+
+
+def _truthy(values: np.ndarray) -> np.ndarray:
+    """Boolean mask of bool(value) for each plain Python value."""
+    return np.frompyfunc(bool, 1, 1)(values).astype(bool)
+
+
+def _first_present(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """
+    Row-wise ``r.get(a) or r.get(b) or r.get(c)`` across columns: the first truthy value
+    among the earlier columns, otherwise the last column's value as-is (so 0.0 and '' are kept).
+    """
+    result = np.full(len(df), None, dtype=object)
+    last = columns[-1]
+    if last in df.columns:
+        result = object_values(df[last])
+    for col in reversed(columns[:-1]):
+        if col in df.columns:
+            # Plain values with None for missing, so the mask is Python truthiness
+            values = object_values(df[col])
+            result = np.where(_truthy(values), values, result)
+    return pd.Series(result, index=df.index, dtype=object)
+
+
+def load_observations(input_path: Path) -> pd.DataFrame:
+    """
+    Load year, day-of-year (MM-DD), lat and lon columns from a combined JSON file.
+    The parsed records come from the shared Parquet cache (see parquet_cache.py).
+    """
+    df = load_combined_observations(input_path)
+    print(f"  Loaded {len(df)} records")
+    
+    # Parse year and day-of-year (MM-DD)
+    date_str = _first_present(df, ["OBSERVATION DATE", "date", "observationDate"])
+    work = pd.DataFrame({
+        'year': date_str.str.slice(0, 4),
+        'day': date_str.str.slice(5),
+        'lat': pd.to_numeric(_first_present(df, ["LATITUDE", "latitude", "lat"]), errors='coerce'),
+        'lon': pd.to_numeric(_first_present(df, ["LONGITUDE", "longitude", "lon", "long"]), errors='coerce'),
+    })
+    return work[work['day'].str.len() == 5]  # Should be "MM-DD"
+
 
 def process_combined_json(input_path: Path) -> Dict[str, Any]:
     """
@@ -33,95 +83,36 @@ def process_combined_json(input_path: Path) -> Dict[str, Any]:
     """
     print(f"Processing {input_path}...")
     
-    with open(input_path, 'r', encoding='utf-8') as f:
-        raw = json.load(f)
-    
-    # Handle different JSON structures
-    if isinstance(raw, list):
-        rows = raw
-    elif isinstance(raw, dict):
-        rows = raw.get('records', raw.get('observations', []))
-    else:
-        rows = []
+    work = load_observations(input_path)
     
-    print(f"  Loaded {len(rows)} records")
+    # Count per (year, day-of-year), then average counts across years
+    avg_counts = work.groupby(['day', 'year']).size().groupby(level='day').mean()
     
-    # Aggregate by day-of-year (MM-DD)
-    # Track: count, sum of latitudes, sum of longitudes, number of years seen
-    day_data = defaultdict(lambda: {
-        'counts': [],  # List of counts per year
-        'lats': [],    # All latitudes seen
-        'lons': []     # All longitudes seen
-    })
-    
-    # Group by (year, day-of-year) first
-    year_day_counts = defaultdict(lambda: defaultdict(int))
-    year_day_lats = defaultdict(lambda: defaultdict(list))
-    year_day_lons = defaultdict(lambda: defaultdict(list))
-    
-    for r in rows:
-        # Get date
-        date_str = r.get("OBSERVATION DATE") or r.get("date") or r.get("observationDate")
-        if not date_str:
-            continue
-        
-        # Parse year and day-of-year
-        try:
-            year = date_str[:4]
-            day_of_year = date_str[5:]  # MM-DD
-            
-            if len(day_of_year) != 5:  # Should be "MM-DD"
-                continue
-                
-            year_day_counts[year][day_of_year] += 1
-            
-            # Get latitude if available
-            lat = r.get("LATITUDE") or r.get("latitude") or r.get("lat")
-            if lat is not None:
-                try:
-                    year_day_lats[year][day_of_year].append(float(lat))
-                except (ValueError, TypeError):
-                    pass
-            
-            # Get longitude if available
-            lon = r.get("LONGITUDE") or r.get("longitude") or r.get("lon") or r.get("long")
-            if lon is not None:
-                try:
-                    year_day_lons[year][day_of_year].append(float(lon))
-                except (ValueError, TypeError):
-                    pass
-                    
-        except (IndexError, ValueError):
-            continue
-    
-    # Now average across years for each day-of-year
-    all_days = set()
-    for year in year_day_counts:
-        all_days.update(year_day_counts[year].keys())
+    # Latitudes and longitudes are averaged over every observation of the day,
+    # summed year by year (in order of first appearance) and in row order
+    # within a year, as a left-to-right sum() over the day's values would
+    day_codes, days = pd.factorize(work['day'])
+    year_codes = pd.factorize(work['year'])[0]
+    order = np.lexsort((year_codes, day_codes))
+    day_codes = day_codes[order]
+    avg_coords = {}
+    for column in ('lat', 'lon'):
+        values = work[column].to_numpy(dtype=np.float64)[order]
+        present = ~np.isnan(values)
+        sums = np.zeros(len(days))
+        np.add.at(sums, day_codes[present], values[present])
+        counts = np.bincount(day_codes[present], minlength=len(days))
+        with np.errstate(invalid='ignore'):
+            avg_coords[column] = pd.Series(sums / counts, index=days)
     
     result = {}
-    for day in sorted(all_days):
-        counts = []
-        all_lats = []
-        all_lons = []
-        
-        for year in year_day_counts:
-            if day in year_day_counts[year]:
-                counts.append(year_day_counts[year][day])
-            if day in year_day_lats[year]:
-                all_lats.extend(year_day_lats[year][day])
-            if day in year_day_lons[year]:
-                all_lons.extend(year_day_lons[year][day])
-        
-        # Average count across years
-        avg_count = sum(counts) / len(counts) if counts else 0
-        avg_lat = sum(all_lats) / len(all_lats) if all_lats else None
-        avg_lon = sum(all_lons) / len(all_lons) if all_lons else None
-        
+    for day, avg_count in zip(avg_counts.index, avg_counts.tolist()):
+        avg_lat = avg_coords['lat'][day]
+        avg_lon = avg_coords['lon'][day]
         result[day] = {
             'count': round(avg_count, 1),
-            'avgLat': round(avg_lat, 4) if avg_lat is not None else None,
-            'avgLon': round(avg_lon, 4) if avg_lon is not None else None
+            'avgLat': round(float(avg_lat), 4) if not math.isnan(avg_lat) else None,
+            'avgLon': round(float(avg_lon), 4) if not math.isnan(avg_lon) else None
         }
     
     print(f"  Generated {len(result)} daily averages")
@@ -134,44 +125,44 @@ def process_heatmap_json(input_path: Path) -> Dict[str, Any]:
     """
     print(f"Processing heatmap {input_path}...")
     
-    with open(input_path, 'r', encoding='utf-8') as f:
-        raw = json.load(f)
+    with open(input_path, 'rb') as f:
+        raw = orjson.loads(f.read())
     
     color_gradient = raw.get('colorGradient', {'min': '#808080', 'max': '#FF8C00'})
     frames = raw.get('frames', [])
     
     print(f"  Loaded {len(frames)} frames")
     
-    # Group frames by week-of-year (MM-DD of week start)
-    week_cells = defaultdict(lambda: defaultdict(list))  # {week_MM-DD: {(lon,lat): [densities]}}
-    
+    # Flatten cells into columns: week-of-year (MM-DD of week start), lon, lat, density
+    weeks: List[str] = []
+    cell_arrays = []
     for frame in frames:
         week_str = frame.get('week', '')
         if len(week_str) < 10:
             continue
         
-        # Extract MM-DD from the week string
-        week_of_year = week_str[5:10]  # MM-DD
-        
-        for cell in frame.get('cells', []):
-            if len(cell) >= 3:
-                lon, lat, density = cell[0], cell[1], cell[2]
-                key = (round(lon, 1), round(lat, 1))
-                week_cells[week_of_year][key].append(density)
+        cells = [cell[:3] for cell in frame.get('cells', []) if len(cell) >= 3]
+        if cells:
+            weeks.extend([week_str[5:10]] * len(cells))
+            cell_arrays.append(np.asarray(cells, dtype=np.float64))
     
     # Average densities for each cell across years
     averaged_frames = []
-    for week_of_year in sorted(week_cells.keys()):
-        cells = []
-        for (lon, lat), densities in week_cells[week_of_year].items():
-            avg_density = sum(densities) / len(densities)
-            cells.append([lon, lat, round(avg_density, 1)])
+    if cell_arrays:
+        values = np.concatenate(cell_arrays)
+        df = pd.DataFrame({
+            'week': weeks,
+            'lon': np.round(values[:, 0], 1),
+            'lat': np.round(values[:, 1], 1),
+            'density': values[:, 2],
+        })
+        averaged = df.groupby(['week', 'lon', 'lat'], sort=False)['density'].mean().reset_index()
         
-        if cells:
+        for week_of_year, sub in averaged.groupby('week', sort=True):
             # Use a reference year (2024) for the week date
             averaged_frames.append({
                 'week': f'2024-{week_of_year}',
-                'cells': cells
+                'cells': np.column_stack([sub['lon'], sub['lat'], sub['density'].round(1)])
             })
     
     print(f"  Generated {len(averaged_frames)} averaged frames")
@@ -188,87 +179,96 @@ def process_temperature_csv(input_path: Path, output_path: Path):
     """
     print(f"Processing temperature data {input_path}...")
     
-    # Read all temperature data
-    day_temps = defaultdict(list)
+    # Read in chunks, keeping only per-day running sums and counts.
+    # np.add.at adds each row in file order, so every day's sum is the same
+    # left-to-right float64 sum as sum() over that day's temperatures
+    day_ids = {}  # MM-DD -> index into sums/counts
+    sums = np.zeros(0)
+    counts = np.zeros(0, dtype=np.int64)
+    for chunk in pd.read_csv(input_path, usecols=['date', 'temp_c'], dtype={'date': str, 'temp_c': 'float64'},
+                             float_precision='round_trip', chunksize=TEMPERATURE_CHUNK_ROWS):
+        chunk = chunk[(chunk['date'].str.len() >= 10) & chunk['temp_c'].notna()]
+        codes, days = pd.factorize(chunk['date'].str.slice(5, 10))  # MM-DD
+        ids = np.array([day_ids.setdefault(day, len(day_ids)) for day in days], dtype=np.intp)
+        if len(day_ids) > len(sums):
+            sums = np.pad(sums, (0, len(day_ids) - len(sums)))
+            counts = np.pad(counts, (0, len(day_ids) - len(counts)))
+        rows = ids[codes]
+        np.add.at(sums, rows, chunk['temp_c'].to_numpy())
+        counts += np.bincount(rows, minlength=len(counts))
     
-    with open(input_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            date_str = row.get('date', '')
-            temp_str = row.get('temp_c', '')
-            
-            if len(date_str) >= 10 and temp_str:
-                day_of_year = date_str[5:10]  # MM-DD
-                try:
-                    temp = float(temp_str)
-                    day_temps[day_of_year].append(temp)
-                except ValueError:
-                    pass
+    # Average by day-of-year, using reference year 2024
+    avg_temps = pd.Series(
+        [round(sums[i] / counts[i], 2) for i in day_ids.values()], index=list(day_ids), dtype='float64'
+    ).sort_index()
     
-    # Write averaged data
-    with open(output_path, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['date', 'temp_c'])
-        
-        for day in sorted(day_temps.keys()):
-            temps = day_temps[day]
-            avg_temp = sum(temps) / len(temps) if temps else 0
-            # Use reference year 2024
-            writer.writerow([f'2024-{day}', round(avg_temp, 2)])
+    averaged = pd.DataFrame({'date': '2024-' + avg_temps.index, 'temp_c': avg_temps.to_numpy()})
+    averaged.to_csv(output_path, index=False, lineterminator='\r\n')  # csv.writer line endings
     
     print(f"  Wrote averaged temperature data to {output_path}")
 
 
-def main():
+def process_species(species: str) -> None:
+    """Build <species>_averaged.json from <species>_combined.json."""
     data_dir = Path(__file__).parent
+    input_file = data_dir / f'{species}_combined.json'
+    output_file = data_dir / f'{species}_averaged.json'
     
-    # Process each species' combined JSON
-    for species in SPECIES:
-        input_file = data_dir / f'{species}_combined.json'
-        output_file = data_dir / f'{species}_averaged.json'
+    if not input_file.exists():
+        print(f"Skipping {species}: {input_file} not found")
+        return
+    
+    try:
+        averaged_data = process_combined_json(input_file)
         
-        if not input_file.exists():
-            print(f"Skipping {species}: {input_file} not found")
-            continue
+        output_data = {
+            'speciesCode': species,
+            'speciesName': SPECIES_NAMES.get(species, species),
+            'description': 'Averaged observation data by day-of-year across 2023-2024',
+            'byDayOfYear': averaged_data
+        }
         
-        try:
-            averaged_data = process_combined_json(input_file)
-            
-            output_data = {
-                'speciesCode': species,
-                'speciesName': SPECIES_NAMES.get(species, species),
-                'description': 'Averaged observation data by day-of-year across 2023-2024',
-                'byDayOfYear': averaged_data
-            }
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, separators=(',', ':'))
-            
-            print(f"  Wrote {output_file} ({output_file.stat().st_size / 1024:.1f} KB)")
-            
-        except Exception as e:
-            print(f"Error processing {species}: {e}")
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(output_data))
+        
+        print(f"  Wrote {output_file} ({output_file.stat().st_size / 1024:.1f} KB)")
+        
+    except Exception as e:
+        print(f"Error processing {species}: {e}")
+
+
+def process_species_heatmap(species: str) -> None:
+    """Build <species>_heatmap_averaged.json from <species>_heatmap.json."""
+    data_dir = Path(__file__).parent
+    input_file = data_dir / f'{species}_heatmap.json'
+    output_file = data_dir / f'{species}_heatmap_averaged.json'
+    
+    if not input_file.exists():
+        print(f"Skipping heatmap for {species}: {input_file} not found")
+        return
     
-    # Process heatmap files
-    for species in SPECIES:
-        input_file = data_dir / f'{species}_heatmap.json'
-        output_file = data_dir / f'{species}_heatmap_averaged.json'
+    try:
+        averaged_data = process_heatmap_json(input_file)
+        averaged_data['speciesName'] = SPECIES_NAMES.get(species, species)
         
-        if not input_file.exists():
-            print(f"Skipping heatmap for {species}: {input_file} not found")
-            continue
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(averaged_data, option=orjson.OPT_SERIALIZE_NUMPY))
         
-        try:
-            averaged_data = process_heatmap_json(input_file)
-            averaged_data['speciesName'] = SPECIES_NAMES.get(species, species)
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(averaged_data, f, separators=(',', ':'))
-            
-            print(f"  Wrote {output_file} ({output_file.stat().st_size / 1024:.1f} KB)")
-            
-        except Exception as e:
-            print(f"Error processing heatmap for {species}: {e}")
+        print(f"  Wrote {output_file} ({output_file.stat().st_size / 1024:.1f} KB)")
+        
+    except Exception as e:
+        print(f"Error processing heatmap for {species}: {e}")
+
+
+def main():
+    data_dir = Path(__file__).parent
+    
+    # Species are independent, so process them in parallel worker processes
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(SPECIES))) as executor:
+        combined_jobs = executor.map(process_species, SPECIES)
+        heatmap_jobs = executor.map(process_species_heatmap, SPECIES)
+        list(combined_jobs)
+        list(heatmap_jobs)
     
     # Process temperature CSV
     temp_input = data_dir / 'temp_grid_daily_2023_2024.csv'
@@ -1,9 +1,10 @@
 import argparse
-import json
 import math
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+import orjson
 import pandas as pd
 
 
@@ -11,19 +12,55 @@ import pandas as pd
 # Helpers
 # ------------------------------
 
-def clamp_lon(lon: float) -> float:
-    """Normalize longitude to [-180, 180)"""
-    return ((lon + 180.0) % 360.0) - 180.0
-
-
-def round_float(x: float, ndigits: int) -> float:
-    return round(float(x), ndigits)
+def cell_array(
+    bin_lon: np.ndarray,
+    bin_lat: np.ndarray,
+    density: np.ndarray,
+    grid_deg: float,
+    round_digits: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Build an (N, 3) array of [lon_center, lat_center, density] rows for grid bins.
+    Each column is computed in place in the output buffer, without temporaries.
+    """
+    out = np.empty((len(bin_lon), 3), dtype=np.float64)
+    lon, lat = out[:, 0], out[:, 1]
+    # Cell centers, with longitude normalized to [-180, 180)
+    np.add(bin_lon, 0.5, out=lon)
+    np.multiply(lon, grid_deg, out=lon)
+    np.add(lon, 180.0, out=lon)
+    np.mod(lon, 360.0, out=lon)
+    np.subtract(lon, 180.0, out=lon)
+    np.add(bin_lat, 0.5, out=lat)
+    np.multiply(lat, grid_deg, out=lat)
+    out[:, 2] = density
+    if round_digits is not None:
+        np.round(out, round_digits, out=out)
+    return out
 
 
 def bin_index(lon: float, lat: float, step: float) -> Tuple[int, int]:
     return (math.floor(lon / step), math.floor(lat / step))
 
 
+_WEEKDAYS = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
+
+
+def week_start(dates: pd.Series, week_freq: str) -> pd.Series:
+    """
+    Start of the week period containing each date.
+    A "W-<DAY>" week ends on <DAY>, so it starts the following day (plain "W" means "W-SUN").
+    """
+    freq = week_freq.upper()
+    if freq == "W":
+        freq = "W-SUN"
+    if freq.startswith("W-") and freq[2:] in _WEEKDAYS:
+        first_weekday = (_WEEKDAYS.index(freq[2:]) + 1) % 7
+        days_into_week = (dates.dt.weekday - first_weekday) % 7
+        return (dates - pd.to_timedelta(days_into_week, unit="D")).dt.normalize()
+    return dates.dt.to_period(week_freq).dt.start_time
+
+
 def _detect_df_col(columns: List[str], candidates: List[str]) -> Optional[str]:
     """Case-insensitive column detection"""
     lower_to_actual: Dict[str, str] = {c.lower(): c for c in columns}
@@ -46,10 +83,13 @@ def build_heatmap_from_dataframe(
     value_candidates: List[str] = ["count", "bird_density", "density", "value"],
     grid_deg: float = 1.0,
     week_freq: str = "W-MON",
+    round_digits: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
     """
     Aggregate bird observations by week and spatial grid cells.
     Returns a list of frames: [{"week": "YYYY-MM-DD", "cells": [[lon, lat, density], ...]}, ...]
+    where each frame's cells are an (N, 3) float array.
+    If round_digits is given, cell values are rounded to that many digits.
     """
     cols = list(df.columns)
     lat_col = _detect_df_col(cols, lat_candidates)
@@ -63,43 +103,45 @@ def build_heatmap_from_dataframe(
             f"Available: {cols}"
         )
 
-    work = df.copy()
-    # Parse date
-    work[date_col] = pd.to_datetime(work[date_col], format="%Y-%m-%d", errors="coerce")
-    work = work.dropna(subset=[date_col, lat_col, lon_col, val_col])
+    # Parse only the needed columns; the input frame is never copied or mutated
+    dates = pd.to_datetime(df[date_col], format="%Y-%m-%d", errors="coerce", cache=True)
+    lat_arr = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float32)
+    lon_arr = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float32)
+    values = pd.to_numeric(df[val_col], errors="coerce")
     
-    # Filter non-finite numbers
-    work = work[pd.to_numeric(work[lat_col], errors="coerce").notna()]
-    work = work[pd.to_numeric(work[lon_col], errors="coerce").notna()]
-    work = work[pd.to_numeric(work[val_col], errors="coerce").notna()]
+    # Drop rows with a missing or unparseable date, coordinate or value
+    mask = dates.notna().to_numpy() & ~np.isnan(lat_arr) & ~np.isnan(lon_arr) & values.notna().to_numpy()
     
-    # Compute week start
-    work["week_start"] = work[date_col].dt.to_period(week_freq).apply(lambda p: p.start_time)
-    
-    # Bin spatial coordinates
-    work["bin_lon"] = work[lon_col].apply(lambda x: math.floor(float(x) / grid_deg))
-    work["bin_lat"] = work[lat_col].apply(lambda x: math.floor(float(x) / grid_deg))
+    work = pd.DataFrame({
+        # Compute week start
+        "week_start": week_start(dates[mask], week_freq).to_numpy(),
+        # Bin spatial coordinates
+        "bin_lon": np.floor(lon_arr[mask] / np.float32(grid_deg)).astype(np.int32),
+        "bin_lat": np.floor(lat_arr[mask] / np.float32(grid_deg)).astype(np.int32),
+        "density": values[mask].to_numpy(),
+    })
     
     # Aggregate by (week, bin_lon, bin_lat) summing value
-    grouped = (
-        work.groupby(["week_start", "bin_lon", "bin_lat"], as_index=False)[val_col]
-        .sum()
-        .rename(columns={val_col: "density"})
-    )
+    grouped = work.groupby(["week_start", "bin_lon", "bin_lat"], as_index=False)["density"].sum()
     grouped = grouped.sort_values(["week_start", "bin_lon", "bin_lat"]).reset_index(drop=True)
     
+    # Build all cells in one pass, then slice out each week (rows are sorted by week)
+    cells_all = cell_array(
+        grouped["bin_lon"].to_numpy(),
+        grouped["bin_lat"].to_numpy(),
+        grouped["density"].to_numpy(),
+        grid_deg,
+        round_digits,
+    )
+    week_values, starts = np.unique(grouped["week_start"].to_numpy(), return_index=True)
+    bounds = np.append(starts, len(grouped))
+    
     # Build frames per week
     frames: List[Dict[str, Any]] = []
-    for week_value, sub in grouped.groupby("week_start"):
-        week_key = week_value.strftime("%Y-%m-%d")
-        cells: List[List[float]] = []
-        for _, r in sub.iterrows():
-            # Cell center
-            lon_center = clamp_lon((r["bin_lon"] + 0.5) * grid_deg)
-            lat_center = (r["bin_lat"] + 0.5) * grid_deg
-            density = float(r["density"])
-            cells.append([lon_center, lat_center, density])
-        if cells:
+    for week_value, start, stop in zip(week_values, bounds[:-1], bounds[1:]):
+        week_key = pd.Timestamp(week_value).strftime("%Y-%m-%d")
+        cells = cells_all[start:stop]
+        if len(cells):
             frames.append({"week": week_key, "cells": cells})
     
     frames.sort(key=lambda x: x["week"])
@@ -187,8 +229,8 @@ def main() -> None:
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
     # Load JSON
-    with open(input_path, "r", encoding="utf-8") as f:
-        raw = json.load(f)
+    with open(input_path, "rb") as f:
+        raw = orjson.loads(f.read())
 
     # Preview: load into a DataFrame
     df_all: Optional[pd.DataFrame] = None
@@ -230,6 +272,7 @@ def main() -> None:
         value_candidates=["count", "bird_density", "density", "value"],
         grid_deg=args.grid_deg,
         week_freq=args.week_freq,
+        round_digits=args.round_digits,
     )
 
     if not frames:
@@ -238,17 +281,6 @@ def main() -> None:
     if args.max_weeks is not None:
         frames = frames[: args.max_weeks]
 
-    # Round all cell values
-    for frame in frames:
-        frame["cells"] = [
-            [
-                round_float(lon, args.round_digits),
-                round_float(lat, args.round_digits),
-                round_float(density, args.round_digits),
-            ]
-            for lon, lat, density in frame["cells"]
-        ]
-
     # Determine output path
     output_path = Path(args.output) if args.output else (input_path.parent / "heatmap.json")
     output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -266,8 +298,8 @@ def main() -> None:
     if args.species_name:
         output_data["speciesName"] = args.species_name
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, ensure_ascii=False, separators=(",", ":"))
+    with open(output_path, "wb") as f:
+        f.write(orjson.dumps(output_data, option=orjson.OPT_SERIALIZE_NUMPY))
 
     print(f"Wrote heatmap JSON with {len(frames)} frames: {output_path}")
 
@@ -1,148 +1,194 @@
 import argparse
-import json
 import math
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 import numpy as np
+import orjson
+
+# Lat/lon units per degree when packing a location into an int64 key
+LOCATION_KEY_SCALE = 1_000_000
+
+
+@dataclass
+class DensityCloud:
+    """
+    Per-location densities stored as parallel lon/lat/density arrays.
+    rank is each location's order of first appearance, used to break ties.
+    """
+    lons: np.ndarray
+    lats: np.ndarray
+    dens: np.ndarray
+    rank: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.lons)
+
+    def subset(self, selection: np.ndarray) -> "DensityCloud":
+        """Select locations by boolean mask or index array."""
+        return DensityCloud(
+            self.lons[selection], self.lats[selection], self.dens[selection], self.rank[selection]
+        )
+
+    def point(self, i: int) -> Tuple[float, float]:
+        return float(self.lons[i]), float(self.lats[i])
 
 
 def load_heatmap(heatmap_path: Path) -> Dict[str, Any]:
     """Load heatmap JSON file"""
-    with open(heatmap_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with open(heatmap_path, 'rb') as f:
+        return orjson.loads(f.read())
+
 
+def location_keys(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Pack (lon, lat) pairs into single int64 keys at 1e-6 degree resolution."""
+    lon_units = np.rint((lons + 180.0) * LOCATION_KEY_SCALE).astype(np.int64)
+    lat_units = np.rint((lats + 90.0) * LOCATION_KEY_SCALE).astype(np.int64)
+    return (lon_units << 28) | lat_units
 
-def aggregate_density_over_time(frames: List[Dict]) -> Dict[Tuple[float, float], float]:
+
+def aggregate_density_over_time(frames: List[Dict]) -> DensityCloud:
     """
     Aggregate density across all time frames for each location.
-    Returns dict: {(lon, lat): total_density}
+    Locations are kept in order of first appearance.
     """
-    density_map = {}
-    for frame in frames:
-        for cell in frame['cells']:
-            lon, lat, density = cell[0], cell[1], cell[2]
-            key = (lon, lat)
-            density_map[key] = density_map.get(key, 0) + density
-    return density_map
+    cells = np.concatenate(
+        [np.asarray(frame['cells'], dtype=np.float64).reshape(-1, 3) for frame in frames]
+        or [np.empty((0, 3))]
+    )
+    _, first_idx, inverse = np.unique(
+        location_keys(cells[:, 0], cells[:, 1]), return_index=True, return_inverse=True
+    )
+    # np.unique sorts by key; restore first-appearance order so ties
+    # downstream resolve the same way as before
+    order = np.argsort(first_idx, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    totals = np.bincount(rank[inverse], weights=cells[:, 2], minlength=len(order))
+    first_cells = cells[first_idx[order]]
+    return DensityCloud(first_cells[:, 0], first_cells[:, 1], totals, np.arange(len(order)))
 
 
-def normalize_densities(density_map: Dict[Tuple[float, float], float]) -> Dict[Tuple[float, float], float]:
-    """Normalize densities to 0-1 range"""
-    if not density_map:
-        return {}
-    max_density = max(density_map.values())
+def normalize_densities(cloud: DensityCloud) -> DensityCloud:
+    """Normalize densities to 0-1 range, in place"""
+    if not cloud:
+        return cloud
+    max_density = cloud.dens.max()
     if max_density == 0:
-        return {k: 0 for k in density_map}
-    return {k: v / max_density for k, v in density_map.items()}
+        cloud.dens.fill(0)
+    else:
+        cloud.dens /= max_density
+    return cloud
 
 
-def filter_geographic_regions(density_map: Dict[Tuple[float, float], float], 
-                              exclude_regions: List[Tuple[Tuple[float, float], Tuple[float, float]]] = None) -> Dict[Tuple[float, float], float]:
+def excluded_region_mask(lons: np.ndarray, lats: np.ndarray,
+                         exclude_regions: List[Tuple[Tuple[float, float], Tuple[float, float]]]) -> np.ndarray:
+    """Return a boolean mask of the locations inside any excluded region."""
+    # (R, 4) bounds: min_lon, max_lon, min_lat, max_lat
+    bounds = np.array([[*lon_range, *lat_range] for lon_range, lat_range in exclude_regions], dtype=np.float64)
+    lons = lons[:, None]
+    lats = lats[:, None]
+    return (
+        (lons >= bounds[:, 0]) & (lons <= bounds[:, 1]) &
+        (lats >= bounds[:, 2]) & (lats <= bounds[:, 3])
+    ).any(axis=1)
+
+
+def filter_geographic_regions(cloud: DensityCloud, 
+                              exclude_regions: List[Tuple[Tuple[float, float], Tuple[float, float]]] = None) -> DensityCloud:
     """
     Filter out specific geographic regions (e.g., New Zealand for Canada geese).
     
     exclude_regions: List of ((min_lon, max_lon), (min_lat, max_lat)) tuples
     """
     if not exclude_regions:
-        return density_map
+        return cloud
     
-    filtered = {}
-    for (lon, lat), density in density_map.items():
-        exclude = False
-        for (lon_range, lat_range) in exclude_regions:
-            min_lon, max_lon = lon_range
-            min_lat, max_lat = lat_range
-            if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat:
-                exclude = True
-                break
-        if not exclude:
-            filtered[(lon, lat)] = density
-    
-    return filtered
+    inside = excluded_region_mask(cloud.lons, cloud.lats, exclude_regions)
+    if not inside.any():
+        return cloud
+    return cloud.subset(~inside)
 
 
-def cluster_by_longitude(density_map: Dict[Tuple[float, float], float], 
+def cluster_by_longitude(cloud: DensityCloud, 
                          num_clusters: int = 2,
                          europe_only: bool = False,
                          americas_south_limit: float = None,
                          americas_only: bool = False,
-                         africa_only_south: bool = False) -> List[Dict[Tuple[float, float], float]]:
+                         africa_only_south: bool = False) -> List[DensityCloud]:
     """
     Cluster points into separate flyways based on longitude using simple binning.
     
-    Returns list of density maps, one per cluster.
+    Returns list of density clouds, one per cluster, each sorted by latitude.
     """
-    if not density_map:
+    if not cloud:
         return []
     
-    # Get all longitudes weighted by density
-    lon_density = {}
-    for (lon, lat), density in density_map.items():
-        lon_density[lon] = lon_density.get(lon, 0) + density
+    lons, lats = cloud.lons, cloud.lats
     
-    # Find longitude ranges with significant density
-    sorted_lons = sorted(lon_density.items())
-    
-    # Identify gaps in longitude distribution
     # Simple approach: split into western hemisphere (-180 to 0) and eastern (0 to 180)
-    western = {}  # Americas
-    eastern = {}  # Europe/Africa/Asia
-    
-    for (lon, lat), density in density_map.items():
-        if lon < -20:  # Americas corridor
-            # Apply southern limit filter if specified
-            if americas_south_limit is None or lat >= americas_south_limit:
-                western[(lon, lat)] = density
-        else:  # Europe/Africa/Asia corridor
-            if not americas_only:  # Skip eastern hemisphere if americas_only is True
-                if europe_only:
-                    # Limit to continental Europe: roughly -10 to 45 longitude, 35 to 72 latitude
-                    if -10 <= lon <= 45 and 35 <= lat <= 72:
-                        eastern[(lon, lat)] = density
-                elif africa_only_south:
-                    # Limit entire eastern flyway to Africa's longitude range: -20 to 51 longitude
-                    if -20 <= lon <= 51:
-                        eastern[(lon, lat)] = density
-                else:
-                    eastern[(lon, lat)] = density
+    # Americas corridor
+    is_western = lons < -20
+    western = is_western.copy()
+    if americas_south_limit is not None:
+        # Apply southern limit filter if specified
+        western &= lats >= americas_south_limit
+    
+    # Europe/Africa/Asia corridor
+    if americas_only:  # Skip eastern hemisphere if americas_only is True
+        eastern = np.zeros(len(cloud), dtype=bool)
+    elif europe_only:
+        # Limit to continental Europe: roughly -10 to 45 longitude, 35 to 72 latitude
+        eastern = ~is_western & (lons >= -10) & (lons <= 45) & (lats >= 35) & (lats <= 72)
+    elif africa_only_south:
+        # Limit entire eastern flyway to Africa's longitude range: -20 to 51 longitude
+        eastern = ~is_western & (lons >= -20) & (lons <= 51)
+    else:
+        eastern = ~is_western
+    
+    # 0 = western, 1 = eastern, 2 = dropped by the flyway limits
+    cluster_id = np.where(western, 0, np.where(eastern, 1, 2)).astype(np.int8)
+    
+    # One stable sort groups each flyway and orders it by latitude, keeping
+    # first-appearance order among equal latitudes
+    order = np.lexsort((lats, cluster_id))
+    bounds = np.searchsorted(cluster_id[order], [0, 1, 2])
     
     clusters = []
-    if western:
-        clusters.append(western)
-    if eastern:
-        clusters.append(eastern)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end > start:
+            clusters.append(cloud.subset(order[start:end]))
     
     return clusters
 
 
-def find_extremes_in_cluster(density_map: Dict[Tuple[float, float], float]) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+def find_extremes_in_cluster(cloud: DensityCloud) -> Tuple[Tuple[float, float], Tuple[float, float]]:
     """
     Find the northernmost and southernmost points with significant density.
+    Expects a cloud sorted by latitude, as returned by cluster_by_longitude.
     Returns: ((lon_north, lat_north), (lon_south, lat_south))
     """
-    if not density_map:
+    if not cloud:
         raise ValueError("Empty density map")
     
-    # Sort by latitude
-    sorted_by_lat = sorted(density_map.items(), key=lambda x: x[0][1])
-    
     # Get southernmost point (lowest latitude)
-    south_point = sorted_by_lat[0][0]
+    south_point = cloud.point(0)
     
     # Get northernmost point (highest latitude)
-    north_point = sorted_by_lat[-1][0]
+    north_point = cloud.point(len(cloud) - 1)
     
     return north_point, south_point
 
 
 def calculate_migration_path(
-    density_map: Dict[Tuple[float, float], float],
+    cloud: DensityCloud,
     north_point: Tuple[float, float],
     south_point: Tuple[float, float],
     num_waypoints: int = 20
 ) -> List[Tuple[float, float]]:
     """
     Calculate migration path from south to north following highest density points.
+    Expects a cloud sorted by latitude, as returned by cluster_by_longitude.
     
     Strategy:
     - Divide the latitude range into segments
@@ -162,21 +208,22 @@ def calculate_migration_path(
     # Create latitude bands
     lat_step = lat_range / (num_waypoints - 1)
     
+    # The cloud is sorted by latitude, so each band is a contiguous slice
     for i in range(num_waypoints):
         target_lat = lat_south + (i * lat_step)
         band_min = target_lat - lat_step / 2
         band_max = target_lat + lat_step / 2
         
         # Find all points in this latitude band
-        band_points = [
-            (loc, density) for loc, density in density_map.items()
-            if band_min <= loc[1] <= band_max
-        ]
+        lo = np.searchsorted(cloud.lats, band_min, side='left')
+        hi = np.searchsorted(cloud.lats, band_max, side='right')
         
-        if band_points:
-            # Choose point with highest density in this band
-            best_point = max(band_points, key=lambda x: x[1])[0]
-            path.append(best_point)
+        if hi > lo:
+            # Choose point with highest density in this band, earliest location on ties
+            band_dens = cloud.dens[lo:hi]
+            ties = np.flatnonzero(band_dens == band_dens.max())
+            best = lo + ties[np.argmin(cloud.rank[lo:hi][ties])]
+            path.append(cloud.point(best))
         else:
             # If no points in band, interpolate
             if path:
@@ -202,20 +249,20 @@ def smooth_path(path: List[Tuple[float, float]], window_size: int = 3) -> List[T
     if len(path) <= window_size:
         return path
     
-    smoothed = []
     half_window = window_size // 2
+    width = 2 * half_window + 1
     
-    for i in range(len(path)):
-        # Handle boundaries
-        start = max(0, i - half_window)
-        end = min(len(path), i + half_window + 1)
-        
-        window = path[start:end]
-        avg_lon = sum(p[0] for p in window) / len(window)
-        avg_lat = sum(p[1] for p in window) / len(window)
-        smoothed.append((avg_lon, avg_lat))
+    # Zero-pad both ends so every index has a full window; padding adds
+    # nothing to the sums and boundary windows divide by their real length
+    coords = np.asarray(path, dtype=np.float64)
+    padded = np.pad(coords, ((half_window, half_window), (0, 0)))
+    sums = np.lib.stride_tricks.sliding_window_view(padded, width, axis=0).sum(axis=-1)
+    
+    idx = np.arange(len(path))
+    counts = np.minimum(len(path), idx + half_window + 1) - np.maximum(0, idx - half_window)
+    smoothed = sums / counts[:, None]
     
-    return smoothed
+    return [tuple(p) for p in smoothed.tolist()]
 
 
 def build_migration_json(heatmap_path: Path, species_name: str, output_path: Path, 
@@ -297,8 +344,8 @@ def build_migration_json(heatmap_path: Path, species_name: str, output_path: Pat
     }
     
     # Write output
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    with open(output_path, 'wb') as f:
+        f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
     
     print(f"\n✅ Wrote migration paths: {output_path}")
 
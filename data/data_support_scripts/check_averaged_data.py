@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Check the vectorized averaging helpers against the per-record rules they replace.
+Run it after changing build_averaged_data.py, update_cangoo_averaged.py or
+parquet_cache.py; it exits with an AssertionError on the first mismatch.
+"""
+
+import os
+import random
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+import orjson
+import pandas as pd
+
+from build_averaged_data import _first_present, process_combined_json
+from parquet_cache import load_combined_observations
+from update_cangoo_averaged import update_cangoo_averaged
+
+
+def check_first_present_mixed_aliases():
+    """Records keyed by different alias columns coalesce like r.get(a) or r.get(b) or r.get(c)."""
+    records = [
+        {'OBSERVATION DATE': '2023-01-01'},
+        {'date': '2023-01-02'},
+        {'observationDate': '2023-01-03'},
+        {'OBSERVATION DATE': '', 'date': '2023-01-04'},
+        {'date': None, 'observationDate': '2023-01-05'},
+        {},
+    ]
+    aliases = ['OBSERVATION DATE', 'date', 'observationDate']
+    # Nullable dtypes, as the shared Parquet cache returns them
+    df = pd.DataFrame({
+        alias: pd.array([r.get(alias) for r in records], dtype='string') for alias in aliases
+    })
+    expected = [r.get(aliases[0]) or r.get(aliases[1]) or r.get(aliases[2]) for r in records]
+    assert _first_present(df, aliases).tolist() == expected
+
+    lats = [{'LATITUDE': 12.5}, {'latitude': 0.0, 'lat': 3.0}, {'lat': 0.0}, {'LATITUDE': None, 'lat': -4.25}, {}]
+    lat_aliases = ['LATITUDE', 'latitude', 'lat']
+    df = pd.DataFrame({
+        alias: pd.array([r.get(alias) for r in lats], dtype='Float64') for alias in lat_aliases
+    })
+    expected = [r.get(lat_aliases[0]) or r.get(lat_aliases[1]) or r.get(lat_aliases[2]) for r in lats]
+    assert _first_present(df, lat_aliases).tolist() == expected
+
+
+def baseline_daily_averages(rows):
+    """The per-record loop process_combined_json replaced, kept as the reference."""
+    year_day_counts = defaultdict(lambda: defaultdict(int))
+    year_day_lats = defaultdict(lambda: defaultdict(list))
+    year_day_lons = defaultdict(lambda: defaultdict(list))
+    
+    for r in rows:
+        date_str = r.get("OBSERVATION DATE") or r.get("date") or r.get("observationDate")
+        if not date_str:
+            continue
+        year = date_str[:4]
+        day_of_year = date_str[5:]
+        if len(day_of_year) != 5:
+            continue
+        year_day_counts[year][day_of_year] += 1
+        
+        lat = r.get("LATITUDE") or r.get("latitude") or r.get("lat")
+        if lat is not None:
+            try:
+                year_day_lats[year][day_of_year].append(float(lat))
+            except (ValueError, TypeError):
+                pass
+        lon = r.get("LONGITUDE") or r.get("longitude") or r.get("lon") or r.get("long")
+        if lon is not None:
+            try:
+                year_day_lons[year][day_of_year].append(float(lon))
+            except (ValueError, TypeError):
+                pass
+    
+    all_days = set()
+    for year in year_day_counts:
+        all_days.update(year_day_counts[year].keys())
+    
+    result = {}
+    for day in sorted(all_days):
+        counts, all_lats, all_lons = [], [], []
+        for year in year_day_counts:
+            if day in year_day_counts[year]:
+                counts.append(year_day_counts[year][day])
+            if day in year_day_lats[year]:
+                all_lats.extend(year_day_lats[year][day])
+            if day in year_day_lons[year]:
+                all_lons.extend(year_day_lons[year][day])
+        avg_count = sum(counts) / len(counts) if counts else 0
+        avg_lat = sum(all_lats) / len(all_lats) if all_lats else None
+        avg_lon = sum(all_lons) / len(all_lons) if all_lons else None
+        result[day] = {
+            'count': round(avg_count, 1),
+            'avgLat': round(avg_lat, 4) if avg_lat is not None else None,
+            'avgLon': round(avg_lon, 4) if avg_lon is not None else None
+        }
+    return result
+
+
+def mixed_alias_records(n=5000, seed=42):
+    """eBird-style and API-style records mixed in one file, including falsy 0.0 coordinates."""
+    rng = random.Random(seed)
+    date_aliases = ['OBSERVATION DATE', 'date', 'observationDate']
+    lat_aliases = ['LATITUDE', 'latitude', 'lat']
+    lon_aliases = ['LONGITUDE', 'longitude', 'lon', 'long']
+    records = []
+    for _ in range(n):
+        record = {}
+        # A few days only, so every day pools many values across both years
+        record[rng.choice(date_aliases)] = f"{rng.choice(['2024', '2023'])}-01-{rng.randint(1, 6):02d}"
+        for aliases, scale in ((lat_aliases, 90), (lon_aliases, 180)):
+            value = rng.choice([0.0, 0.0, None, round(rng.uniform(-scale, scale), 6), rng.uniform(-scale, scale)])
+            record[rng.choice(aliases)] = value
+            if rng.random() < 0.2:
+                # A falsy earlier alias falls through to the next one
+                record[aliases[0]] = rng.choice([0.0, None])
+        records.append(record)
+    # Latitudes whose left-to-right mean (-0.3312500000000001) rounds differently
+    # from the exact mean, so the summation order shows in the rounded output
+    lats = [-3.6558, -9.79933, 0.65256, 8.39329, 4.58108, -2.1593]
+    records += [
+        {date_aliases[i % 3]: '2023-01-07', lat_aliases[i % 3]: lat, 'lon': 0.0} for i, lat in enumerate(lats)
+    ]
+    # Dates that are skipped: missing, empty, or not YYYY-MM-DD
+    records += [{'lat': 1.0}, {'date': '', 'lat': 2.0}, {'date': '2023-1-1', 'lat': 3.0}]
+    return records
+
+
+def check_daily_averages_match_baseline():
+    """process_combined_json gives the baseline loop's per-day output, from a cold and a warm cache."""
+    records = mixed_alias_records()
+    expected = baseline_daily_averages(records)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / 'fixture_combined.json'
+        json_path.write_bytes(orjson.dumps({'records': records}))
+        for _ in range(2):
+            assert process_combined_json(json_path) == expected
+
+
+def baseline_cangoo_averages(observations):
+    """The per-observation loop update_cangoo_averaged replaced, kept as the reference."""
+    year_day_data = defaultdict(lambda: {'total_count': 0, 'lats': [], 'lons': []})
+    for obs in observations:
+        date_str = obs.get('date', '')
+        if not date_str or len(date_str) < 10:
+            continue
+        year = date_str[:4]
+        day_of_year = date_str[5:10]
+        count = obs.get('count', 1)
+        if not isinstance(count, (int, float)) or count < 0:
+            count = 1
+        year_day_data[(year, day_of_year)]['total_count'] += count
+        for key, values in (('lat', 'lats'), ('lon', 'lons')):
+            if obs.get(key) is not None:
+                try:
+                    year_day_data[(year, day_of_year)][values].append(float(obs[key]))
+                except (ValueError, TypeError):
+                    pass
+    
+    day_averages = defaultdict(lambda: {'counts': [], 'lats': [], 'lons': []})
+    for (year, day), data in year_day_data.items():
+        day_averages[day]['counts'].append(data['total_count'])
+        day_averages[day]['lats'].extend(data['lats'])
+        day_averages[day]['lons'].extend(data['lons'])
+    
+    result = {}
+    for day in sorted(day_averages.keys()):
+        counts, lats, lons = (day_averages[day][key] for key in ('counts', 'lats', 'lons'))
+        avg_count = sum(counts) / len(counts) if counts else 0
+        avg_lat = sum(lats) / len(lats) if lats else None
+        avg_lon = sum(lons) / len(lons) if lons else None
+        result[day] = {
+            'count': round(avg_count, 1),
+            'avgLat': round(avg_lat, 4) if avg_lat is not None else None,
+            'avgLon': round(avg_lon, 4) if avg_lon is not None else None
+        }
+    return result
+
+
+def cangoo_observations(n=5000, seed=7):
+    """Observations with every kind of count and coordinate the type checks distinguish."""
+    rng = random.Random(seed)
+    counts = [1, 3, 12, 2.5, 0, -4, '5', 'X', None, True]
+    coords = [None, '', 'n/a', '41.25']
+    observations = []
+    for _ in range(n):
+        obs = {'date': f"{rng.choice(['2024', '2023'])}-03-{rng.randint(1, 6):02d}"}
+        if rng.random() < 0.9:
+            obs['count'] = rng.choice(counts)
+        obs['lat'] = rng.choice(coords + [rng.uniform(-90, 90), 0.0])
+        obs['lon'] = rng.choice(coords + [rng.uniform(-180, 180), 0.0])
+        observations.append(obs)
+    # 2024 appears before 2023 on this day, unlike the file as a whole, and its
+    # latitudes' left-to-right mean rounds differently from the exact mean
+    lats = [-3.6558, -9.79933, 0.65256, 8.39329, 4.58108, -2.1593]
+    observations += [{'date': f"{'2024' if i < 3 else '2023'}-03-07", 'lat': lat} for i, lat in enumerate(lats)]
+    observations += [{'count': 2}, {'date': '', 'count': 2}, {'date': '2023-03', 'count': 2}]
+    return observations
+
+
+def check_cangoo_averages_match_baseline():
+    """update_cangoo_averaged writes the baseline loop's per-day output, from a cold and a warm cache."""
+    observations = cangoo_observations()
+    expected = baseline_cangoo_averages(observations)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        (data_dir / 'cangoo_combined.json').write_bytes(orjson.dumps({'observations': observations}))
+        for _ in range(2):
+            update_cangoo_averaged(data_dir)
+            written = orjson.loads((data_dir / 'cangoo_averaged.json').read_bytes())
+            assert written['byDayOfYear'] == expected
+
+
+def check_cache_sees_rewritten_source():
+    """A source rewritten with its old mtime is parsed again instead of read from the stale cache."""
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / 'fixture_combined.json'
+        json_path.write_bytes(orjson.dumps([{'date': '2023-01-01'}]))
+        mtime_ns = json_path.stat().st_mtime_ns
+        assert len(load_combined_observations(json_path)) == 1
+        json_path.write_bytes(orjson.dumps([{'date': '2023-01-01'}, {'date': '2023-01-02'}]))
+        os.utime(json_path, ns=(mtime_ns, mtime_ns))
+        assert len(load_combined_observations(json_path)) == 2
+
+
+def main():
+    check_first_present_mixed_aliases()
+    print("✓ _first_present coalesces mixed alias columns")
+    check_daily_averages_match_baseline()
+    print("✓ process_combined_json matches the per-record loop")
+    check_cangoo_averages_match_baseline()
+    print("✓ update_cangoo_averaged matches the per-observation loop")
+    check_cache_sees_rewritten_source()
+    print("✓ Parquet cache is rebuilt when its source is rewritten")
+
+
+if __name__ == '__main__':
+    main()
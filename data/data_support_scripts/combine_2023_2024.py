@@ -4,9 +4,49 @@ Combine temp_grid_daily_2023.csv and temp_grid_daily_2024.csv into a single file
 Stacks the data chronologically (2023 first, then 2024).
 """
 
-import csv
 import os
 
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def append_csv_body(input_file, outfile, label):
+    """Copy every line after the header of input_file to outfile as raw bytes.
+
+    Line endings are normalized to CRLF, as csv.writer writes them, so the body
+    matches the header whether the input ends its lines with LF or CRLF.
+    Returns the number of rows copied.
+    """
+    rows = 0
+    next_report = 1000000
+    last = b'\n'
+    with open(input_file, 'rb') as infile:
+        infile.readline()  # Skip header
+        
+        while True:
+            block = infile.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            # Keep a CRLF that straddles two blocks together
+            while block.endswith(b'\r'):
+                extra = infile.read(1)
+                if not extra:
+                    break
+                block += extra
+            outfile.write(block.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n'))
+            rows += block.count(b'\n')
+            last = block[-1:]
+            
+            if rows >= next_report:
+                print(f"  Processed {rows:,} rows from {label}...")
+                next_report = (rows // 1000000 + 1) * 1000000
+    
+    # Terminate a final row that has no trailing newline
+    if last != b'\n':
+        outfile.write(b'\r\n')
+        rows += 1
+    return rows
+
+
 def combine_2023_2024():
     """Combine 2023 and 2024 temperature data files."""
     data_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,43 +59,20 @@ def combine_2023_2024():
     print(f"  Input 2024: {input_2024}")
     print(f"  Output: {output_file}")
     
-    rows_2023 = 0
-    rows_2024 = 0
-    
-    with open(output_file, 'w', encoding='utf-8', newline='') as outfile:
-        writer = csv.writer(outfile)
-        
+    # Both inputs share the same schema, so rows are copied through verbatim
+    # apart from their line endings
+    with open(output_file, 'wb') as outfile:
         # Write header
-        writer.writerow(['date', 'lat', 'lon', 'temp_c'])
+        outfile.write(b'date,lat,lon,temp_c\r\n')
         
         # Read and write 2023 data
         print("\nProcessing 2023 data...")
-        with open(input_2023, 'r', encoding='utf-8') as infile:
-            reader = csv.reader(infile)
-            next(reader)  # Skip header
-            
-            for row in reader:
-                writer.writerow(row)
-                rows_2023 += 1
-                
-                if rows_2023 % 1000000 == 0:
-                    print(f"  Processed {rows_2023:,} rows from 2023...")
-        
+        rows_2023 = append_csv_body(input_2023, outfile, '2023')
         print(f"  Completed 2023: {rows_2023:,} rows")
         
         # Read and write 2024 data
         print("\nProcessing 2024 data...")
-        with open(input_2024, 'r', encoding='utf-8') as infile:
-            reader = csv.reader(infile)
-            next(reader)  # Skip header
-            
-            for row in reader:
-                writer.writerow(row)
-                rows_2024 += 1
-                
-                if rows_2024 % 1000000 == 0:
-                    print(f"  Processed {rows_2024:,} rows from 2024...")
-        
+        rows_2024 = append_csv_body(input_2024, outfile, '2024')
         print(f"  Completed 2024: {rows_2024:,} rows")
     
     total_rows = rows_2023 + rows_2024
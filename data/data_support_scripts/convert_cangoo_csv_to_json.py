@@ -3,10 +3,38 @@
 Convert cangoo CSV files back to JSON format
 """
 
-import json
-import csv
 from pathlib import Path
-from collections import defaultdict
+
+import orjson
+import pandas as pd
+
+# Output field order, and how each CSV column is parsed
+OBSERVATION_DTYPES = {
+    'lat': 'float64',
+    'lon': 'float64',
+    'date': str,
+    'count': 'int64',
+    'comName': str,
+    'sciName': str,
+    'countryCode': str,
+    'stateCode': str,
+    'speciesCode': str,
+}
+
+
+def read_observations_csv(csv_path: Path) -> pd.DataFrame:
+    """Read one cangoo CSV part with the observation schema."""
+    # na_filter=False keeps empty text fields as '' like csv.DictReader, and
+    # round_trip parsing gives the same floats as float()
+    df = pd.read_csv(
+        csv_path,
+        usecols=list(OBSERVATION_DTYPES),
+        dtype=OBSERVATION_DTYPES,
+        na_filter=False,
+        float_precision='round_trip',
+    )
+    return df[list(OBSERVATION_DTYPES)]
+
 
 def convert_csv_to_json():
     data_dir = Path(__file__).parent
@@ -14,96 +42,64 @@ def convert_csv_to_json():
     csv_file_2 = data_dir / 'cangoo_combined_part2.csv'
     output_file = data_dir / 'cangoo_combined.json'
     
-    observations = []
-    
     # Read first CSV
     print(f"Reading {csv_file_1}...")
-    with open(csv_file_1, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            observations.append({
-                'lat': float(row['lat']),
-                'lon': float(row['lon']),
-                'date': row['date'],
-                'count': int(row['count']),
-                'comName': row['comName'],
-                'sciName': row['sciName'],
-                'countryCode': row['countryCode'],
-                'stateCode': row['stateCode'],
-                'speciesCode': row['speciesCode']
-            })
-    
-    print(f"  Loaded {len(observations)} records from part 1")
+    part1 = read_observations_csv(csv_file_1)
+    print(f"  Loaded {len(part1)} records from part 1")
     
     # Read second CSV
     print(f"Reading {csv_file_2}...")
-    with open(csv_file_2, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            observations.append({
-                'lat': float(row['lat']),
-                'lon': float(row['lon']),
-                'date': row['date'],
-                'count': int(row['count']),
-                'comName': row['comName'],
-                'sciName': row['sciName'],
-                'countryCode': row['countryCode'],
-                'stateCode': row['stateCode'],
-                'speciesCode': row['speciesCode']
-            })
+    part2 = read_observations_csv(csv_file_2)
+    df = pd.concat([part1, part2], ignore_index=True)
+    print(f"  Loaded {len(df)} total records")
     
-    print(f"  Loaded {len(observations)} total records")
-    
-    # Calculate metadata
-    dates = [obs['date'] for obs in observations]
-    lats = [obs['lat'] for obs in observations]
-    lons = [obs['lon'] for obs in observations]
-    counts = [obs['count'] for obs in observations]
+    # Calculate metadata in one aggregation pass over the columns
+    stats = df.agg({
+        'date': ['min', 'max'],
+        'lat': ['min', 'max'],
+        'lon': ['min', 'max'],
+        'countryCode': ['nunique'],
+        'stateCode': ['nunique'],
+    })
+    missing_counts = int((df['count'] == 0).sum())
     
     # Group by month for monthly counts
-    monthly_counts = defaultdict(int)
-    for date in dates:
-        month_key = date[:7]  # YYYY-MM
-        monthly_counts[month_key] += 1
-    
-    # Get unique country and state codes
-    country_codes = set(obs['countryCode'] for obs in observations)
-    state_codes = set(obs['stateCode'] for obs in observations)
+    monthly_counts = df['date'].str[:7].value_counts().sort_index()  # YYYY-MM
     
     # Build metadata
     metadata = {
         'speciesCode': 'cangoo',
         'generatedAt': '2025-12-03T00:00:00Z',
-        'records': len(observations),
+        'records': len(df),
         'missing_lat': {'count': 0, 'percent': 0.0},
         'missing_lon': {'count': 0, 'percent': 0.0},
         'missing_date': {'count': 0, 'percent': 0.0},
-        'missing_count': {'count': sum(1 for c in counts if c == 0), 'percent': round(sum(1 for c in counts if c == 0) / len(counts) * 100, 2)},
+        'missing_count': {'count': missing_counts, 'percent': round(missing_counts / len(df) * 100, 2)},
         'missing_countryCode': {'count': 0, 'percent': 0.0},
         'missing_stateCode': {'count': 0, 'percent': 0.0},
         'missing_comName': {'count': 0, 'percent': 0.0},
         'missing_sciName': {'count': 0, 'percent': 0.0},
-        'date_min': min(dates),
-        'date_max': max(dates),
-        'lat_min': min(lats),
-        'lat_max': max(lats),
-        'lon_min': min(lons),
-        'lon_max': max(lons),
-        'monthly_counts': dict(sorted(monthly_counts.items())),
-        'unique_countryCode': len(country_codes),
-        'unique_stateCode': len(state_codes)
+        'date_min': stats.at['min', 'date'],
+        'date_max': stats.at['max', 'date'],
+        'lat_min': float(stats.at['min', 'lat']),
+        'lat_max': float(stats.at['max', 'lat']),
+        'lon_min': float(stats.at['min', 'lon']),
+        'lon_max': float(stats.at['max', 'lon']),
+        'monthly_counts': {month: int(n) for month, n in monthly_counts.items()},
+        'unique_countryCode': int(stats.at['nunique', 'countryCode']),
+        'unique_stateCode': int(stats.at['nunique', 'stateCode'])
     }
     
     # Build final JSON structure
     output_data = {
         'metadata': metadata,
-        'observations': observations
+        'observations': df.to_dict(orient='records')
     }
     
     # Write JSON file
     print(f"Writing {output_file}...")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, separators=(',', ':'))
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(output_data))
     
     file_size_mb = output_file.stat().st_size / (1024 * 1024)
     print(f"✓ Created {output_file} ({file_size_mb:.1f} MB)")
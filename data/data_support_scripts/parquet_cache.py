@@ -0,0 +1,136 @@
+"""
+Parquet side-car caches shared by the data support scripts.
+A parsed source file is cached as <source>.parquet next to it and reused while the source is unchanged.
+"""
+
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Arrow types read back as pandas nullable dtypes, so missing values stay distinct from 0 / NaN
+NULLABLE_DTYPES = {
+    pa.int64(): pd.Int64Dtype(),
+    pa.float64(): pd.Float64Dtype(),
+    pa.string(): pd.StringDtype(),
+    pa.large_string(): pd.StringDtype(),
+    pa.bool_(): pd.BooleanDtype(),
+}
+
+# Parquet schema metadata keys: the source stamp the cache was built from, and the
+# columns stored as JSON text
+SOURCE_STAMP_KEY = b'source_stamp'
+JSON_COLUMNS_KEY = b'json_columns'
+
+
+def _source_stamp(source_path: Path) -> bytes:
+    """Size and nanosecond mtime of the source file, as stored in its cache's metadata."""
+    stat = source_path.stat()
+    return orjson.dumps({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Arrow table of df. Object columns Arrow cannot type (mixed Python types) are stored as
+    JSON text of each value and listed in the schema metadata, so they read back unchanged.
+    """
+    json_columns = []
+    for name in df.columns:
+        if df[name].dtype == object:
+            try:
+                pa.array(df[name], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                json_columns.append(name)
+    
+    encoded = df.assign(**{
+        name: pd.Series([None if v is None else orjson.dumps(v).decode() for v in object_values(df[name])],
+                        index=df.index, dtype=object)
+        for name in json_columns
+    })
+    table = pa.Table.from_pandas(encoded, preserve_index=False)
+    return table.replace_schema_metadata({**table.schema.metadata, JSON_COLUMNS_KEY: orjson.dumps(json_columns)})
+
+
+def _decode_json_columns(df: pd.DataFrame, metadata: dict) -> pd.DataFrame:
+    """Decode the JSON text columns written by _to_table back to their Python values."""
+    for name in orjson.loads(metadata.get(JSON_COLUMNS_KEY, b'[]')):
+        if name in df.columns:
+            df[name] = pd.Series([None if v is None else orjson.loads(v) for v in object_values(df[name])],
+                                 index=df.index, dtype=object)
+    return df
+
+
+def read_cached(source_path, build: Callable[[Path], pd.DataFrame],
+                columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Return build(source_path), cached as a zstd-compressed Parquet file next to the source.
+    The cache is reused only while the source's size and nanosecond mtime match the ones
+    recorded in the cache's metadata, rather than while the cache merely looks newer.
+    """
+    source_path = Path(source_path)
+    cache_path = source_path.with_suffix('.parquet')
+    # Stamped before building, so a source changed mid-build is rebuilt next time
+    stamp = _source_stamp(source_path)
+    if cache_path.exists():
+        metadata = pq.read_schema(cache_path).metadata or {}
+        if metadata.get(SOURCE_STAMP_KEY) == stamp:
+            return _decode_json_columns(pd.read_parquet(cache_path, columns=columns), metadata)
+    
+    df = build(source_path)
+    table = _to_table(df)
+    table = table.replace_schema_metadata({**table.schema.metadata, SOURCE_STAMP_KEY: stamp})
+    pq.write_table(table, cache_path, compression='zstd')
+    return df[columns] if columns else df
+
+
+def _record_column(values: list) -> pa.Array:
+    """
+    Convert one record field to Arrow, or None when Arrow cannot type it. Ints mixed with
+    floats become floats; fields mixing text with other types stay as Python objects.
+    """
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+
+def _parse_combined_json(json_path: Path) -> pd.DataFrame:
+    """Parse the records of a <species>_combined.json file into one column per field."""
+    # Parse straight from the raw bytes; only the records outlive the parse
+    with open(json_path, 'rb') as f:
+        raw = orjson.loads(f.read())
+    
+    # Handle different JSON structures
+    if isinstance(raw, list):
+        rows = raw
+    elif isinstance(raw, dict):
+        rows = raw.get('records', raw.get('observations', []))
+    else:
+        rows = []
+    
+    fields = dict.fromkeys(key for row in rows for key in row)
+    arrays, mixed = {}, {}
+    for field in fields:
+        values = [row.get(field) for row in rows]
+        array = _record_column(values)
+        if array is None:
+            mixed[field] = pd.Series(values, dtype=object)
+        else:
+            arrays[field] = array
+    
+    df = pa.table(arrays).to_pandas(types_mapper=NULLABLE_DTYPES.get) if arrays else pd.DataFrame(index=range(len(rows)))
+    return df.assign(**mixed)[list(fields)]
+
+
+def load_combined_observations(json_path) -> pd.DataFrame:
+    """Load every record of a <species>_combined.json file, one column per field."""
+    return read_cached(json_path, _parse_combined_json)
+
+
+def object_values(values: pd.Series) -> np.ndarray:
+    """Plain Python values of a column, with None for missing values (like record.get())."""
+    return values.to_numpy(dtype=object, na_value=None)
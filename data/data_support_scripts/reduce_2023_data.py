@@ -6,7 +6,13 @@ Reduce 2023 temperature data by 50% while maintaining spatial and temporal distr
 import csv
 import os
 import random
-from collections import defaultdict
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+COUNT_CHUNK_ROWS = 5_000_000
+WRITE_BUFFER_SIZE = 1 << 20
 
 def reduce_2023_data():
     """Reduce 2023 data by 50% with even spatial and temporal distribution."""
@@ -17,64 +23,70 @@ def reduce_2023_data():
     
     print("Analyzing 2023 data structure...")
     
-    # First pass: group data by spatial-temporal bins
+    # First pass: count rows per spatial-temporal bin
     # Use rounded coordinates to create spatial bins
-    spatial_temporal_bins = defaultdict(list)  # {(lat_bin, lon_bin, date): [rows]}
+    bin_counts = Counter()  # {(lat_bin, lon_bin, date): row count}
     
-    with open(input_file, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        
-        rows_read = 0
-        for row in reader:
-            lat = float(row['lat'])
-            lon = float(row['lon'])
-            date = row['date']
-            
-            # Create spatial bins (round to 1 degree for spatial distribution)
-            lat_bin = round(lat, 0)  # 1 degree bins
-            lon_bin = round(lon, 0)
-            
-            spatial_temporal_bins[(lat_bin, lon_bin, date)].append(row)
-            rows_read += 1
-            
-            if rows_read % 5000000 == 0:
-                print(f"  Indexed {rows_read:,} rows...")
+    # round_trip parsing matches float(), and na_filter=False keeps empty or
+    # NA-like dates as the literal strings, so bins agree with the second pass
+    chunks = pd.read_csv(
+        input_file,
+        usecols=['date', 'lat', 'lon'],
+        dtype={'date': str, 'lat': 'float64', 'lon': 'float64'},
+        na_filter=False,
+        float_precision='round_trip',
+        chunksize=COUNT_CHUNK_ROWS,
+    )
+    
+    rows_read = 0
+    for chunk in chunks:
+        # Create spatial bins (round to 1 degree for spatial distribution);
+        # np.round to 0 digits rounds half to even like round()
+        chunk_counts = chunk.groupby(
+            [np.round(chunk['lat'], 0), np.round(chunk['lon'], 0), chunk['date']], sort=False
+        ).size()
+        bin_counts.update(dict(zip(chunk_counts.index.tolist(), chunk_counts.tolist())))
+        rows_read += len(chunk)
+        print(f"  Indexed {rows_read:,} rows...")
     
     print(f"  Total rows: {rows_read:,}")
-    print(f"  Spatial-temporal bins: {len(spatial_temporal_bins):,}")
+    print(f"  Spatial-temporal bins: {len(bin_counts):,}")
     
     # Calculate target: 50% of rows
     target_rows = rows_read // 2
     print(f"\nTarget: {target_rows:,} rows (50% reduction)")
     
-    # Sample from each bin proportionally to maintain distribution
-    print("\nSampling data to maintain distribution...")
-    
-    sampled_rows = []
-    rows_sampled = 0
-    
-    # Sample 50% from each spatial-temporal bin
-    for (lat_bin, lon_bin, date), rows in spatial_temporal_bins.items():
-        # Sample 50% from each bin to maintain distribution
-        num_to_sample = max(1, len(rows) // 2)  # At least 1 if bin has data
-        if len(rows) > 0:
-            sampled = random.sample(rows, min(num_to_sample, len(rows)))
-            sampled_rows.extend(sampled)
-            rows_sampled += len(sampled)
-    
-    print(f"  Sampled {rows_sampled:,} rows from {len(spatial_temporal_bins):,} bins")
+    # Sample 50% from each bin to maintain distribution, at least 1 if bin has data.
+    # Each bin tracks [rows still to keep, rows not yet seen].
+    bin_state = {key: [max(1, n // 2), n] for key, n in bin_counts.items()}
+    rows_sampled = sum(needed for needed, _ in bin_state.values())
+    del bin_counts
     
-    # Shuffle to avoid any ordering bias
-    random.shuffle(sampled_rows)
-    
-    # Write sampled data
+    # Second pass: selection sampling (Knuth's Algorithm S) keeps exactly the
+    # target number of rows per bin while streaming them straight to disk
+    print("\nSampling data to maintain distribution...")
     print("\nWriting reduced dataset...")
-    with open(temp_output, 'w', encoding='utf-8', newline='') as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(['date', 'lat', 'lon', 'temp_c'])
+    with open(input_file, 'r', encoding='utf-8') as infile, \
+         open(temp_output, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as outfile:
+        reader = csv.reader(infile)
+        header = next(reader)
+        date_idx, lat_idx, lon_idx = header.index('date'), header.index('lat'), header.index('lon')
+        temp_idx = header.index('temp_c')
         
-        for row in sampled_rows:
-            writer.writerow([row['date'], row['lat'], row['lon'], row['temp_c']])
+        # Fields are plain dates and numbers, so rows need no CSV quoting
+        outfile.write('date,lat,lon,temp_c\n')
+        
+        for row in reader:
+            lat_bin = round(float(row[lat_idx]), 0)
+            lon_bin = round(float(row[lon_idx]), 0)
+            state = bin_state[(lat_bin, lon_bin, row[date_idx])]
+            
+            if random.random() * state[1] < state[0]:
+                outfile.write(f"{row[date_idx]},{row[lat_idx]},{row[lon_idx]},{row[temp_idx]}\n")
+                state[0] -= 1
+            state[1] -= 1
+    
+    print(f"  Sampled {rows_sampled:,} rows from {len(bin_state):,} bins")
     
     # Replace original with reduced file
     os.replace(temp_output, output_file)
@@ -4,10 +4,17 @@ Remove 60% of data points from Alberta evenly in temp_grid_daily_2024.csv.
 Alberta bounds: 49°N to 60°N latitude, 110°W to 120°W longitude
 """
 
-import csv
 import os
-import random
-from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from bin_sampling import rank_within_bins
+
+# Set random seed for reproducibility
+RANDOM_SEED = 42
+
+WRITE_CHUNK_ROWS = 1_000_000
 
 def reduce_alberta_2024():
     """Remove 60% of Alberta data points evenly while keeping all other data."""
@@ -25,44 +32,32 @@ def reduce_alberta_2024():
     print("Analyzing temp_grid_daily_2024.csv structure...")
     print(f"Alberta bounds: {ALBERTA_LAT_MIN}°N to {ALBERTA_LAT_MAX}°N, {ALBERTA_LON_MIN}°W to {ALBERTA_LON_MAX}°W")
     
-    # First pass: separate Alberta and non-Alberta rows
-    alberta_rows = []
-    non_alberta_rows = []
-    alberta_bins = defaultdict(list)  # {(lat_bin, lon_bin, date): [rows]}
-    
-    rows_read = 0
-    alberta_count = 0
-    
-    with open(input_file, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        
-        for row in reader:
-            lat = float(row['lat'])
-            lon = float(row['lon'])
-            date = row['date']
-            
-            # Check if row is in Alberta
-            is_alberta = (ALBERTA_LAT_MIN <= lat <= ALBERTA_LAT_MAX and 
-                         ALBERTA_LON_MIN <= lon <= ALBERTA_LON_MAX)
-            
-            if is_alberta:
-                alberta_count += 1
-                # Create spatial bins for even distribution
-                lat_bin = round(lat, 1)  # 0.1 degree bins for finer distribution
-                lon_bin = round(lon, 1)
-                alberta_bins[(lat_bin, lon_bin, date)].append(row)
-            else:
-                non_alberta_rows.append(row)
-            
-            rows_read += 1
-            
-            if rows_read % 5000000 == 0:
-                print(f"  Processed {rows_read:,} rows... (Alberta: {alberta_count:,})")
+    # Keep every field as text so kept rows are written back unchanged
+    df = pd.read_csv(input_file, usecols=['date', 'lat', 'lon', 'temp_c'], dtype=str, na_filter=False)
+    lat = df['lat'].astype('float64')
+    lon = df['lon'].astype('float64')
+    rows_read = len(df)
+    
+    # Separate Alberta and non-Alberta rows
+    is_alberta = lat.between(ALBERTA_LAT_MIN, ALBERTA_LAT_MAX) & lon.between(ALBERTA_LON_MIN, ALBERTA_LON_MAX)
+    alberta_count = int(is_alberta.sum())
+    
+    alberta = df[is_alberta]
+    
+    # Create spatial bins for even distribution (0.1 degree bins for finer distribution),
+    # packing (lat_bin, lon_bin, date) into one int64 key per row
+    lat_bin = np.rint(lat[is_alberta].to_numpy() * 10).astype(np.int64) - round(ALBERTA_LAT_MIN * 10)
+    lon_bin = np.rint(lon[is_alberta].to_numpy() * 10).astype(np.int64) - round(ALBERTA_LON_MIN * 10)
+    lon_bin_count = round((ALBERTA_LON_MAX - ALBERTA_LON_MIN) * 10) + 1
+    date_ids, dates = pd.factorize(alberta['date'])
+    bin_keys = (lat_bin * lon_bin_count + lon_bin) * len(dates) + date_ids
+    bin_ids, bin_keys = pd.factorize(bin_keys)
+    num_bins = len(bin_keys)
     
     print(f"\n  Total rows: {rows_read:,}")
     print(f"  Alberta rows: {alberta_count:,}")
-    print(f"  Non-Alberta rows: {len(non_alberta_rows):,}")
-    print(f"  Alberta spatial-temporal bins: {len(alberta_bins):,}")
+    print(f"  Non-Alberta rows: {rows_read - alberta_count:,}")
+    print(f"  Alberta spatial-temporal bins: {num_bins:,}")
     
     # Calculate target: keep 40% of Alberta rows (remove 60%)
     target_alberta_rows = int(alberta_count * 0.4)
@@ -71,35 +66,25 @@ def reduce_alberta_2024():
     # Sample 40% from each Alberta bin evenly to maintain distribution
     print("\nSampling Alberta data to maintain even distribution...")
     
-    sampled_alberta_rows = []
-    rows_sampled = 0
-    
-    # Sample 40% from each spatial-temporal bin
-    for (lat_bin, lon_bin, date), rows in alberta_bins.items():
-        # Sample 40% from each bin to maintain distribution
-        num_to_sample = max(1, int(len(rows) * 0.4))  # At least 1 if bin has data
-        if len(rows) > 0:
-            sampled = random.sample(rows, min(num_to_sample, len(rows)))
-            sampled_alberta_rows.extend(sampled)
-            rows_sampled += len(sampled)
+    # Keep the first 40% of each bin in a random order (at least 1 if bin has data)
+    rng = np.random.default_rng(RANDOM_SEED)
+    ranks, bin_sizes = rank_within_bins(bin_ids, rng)
+    num_to_sample = np.maximum(1, (bin_sizes * 0.4).astype(np.int64))
+    sampled_alberta = alberta[ranks < num_to_sample[bin_ids]]
+    rows_sampled = len(sampled_alberta)
     
-    print(f"  Sampled {rows_sampled:,} Alberta rows from {len(alberta_bins):,} bins")
+    print(f"  Sampled {rows_sampled:,} Alberta rows from {num_bins:,} bins")
     print(f"  Removed {alberta_count - rows_sampled:,} Alberta rows ({(1 - rows_sampled/alberta_count)*100:.1f}%)")
     
     # Combine sampled Alberta rows with all non-Alberta rows
-    all_rows = sampled_alberta_rows + non_alberta_rows
+    all_rows = pd.concat([sampled_alberta, df[~is_alberta]], ignore_index=True)
     
     # Shuffle to avoid any ordering bias
-    random.shuffle(all_rows)
+    all_rows = all_rows.iloc[rng.permutation(len(all_rows))]
     
     # Write reduced data
     print("\nWriting reduced dataset...")
-    with open(temp_output, 'w', encoding='utf-8', newline='') as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(['date', 'lat', 'lon', 'temp_c'])
-        
-        for row in all_rows:
-            writer.writerow([row['date'], row['lat'], row['lon'], row['temp_c']])
+    all_rows.to_csv(temp_output, columns=['date', 'lat', 'lon', 'temp_c'], index=False, chunksize=WRITE_CHUNK_ROWS)
     
     # Replace original with reduced file
     os.replace(temp_output, output_file)
@@ -113,7 +98,5 @@ def reduce_alberta_2024():
     print(f"  File updated: {output_file}")
 
 if __name__ == '__main__':
-    # Set random seed for reproducibility
-    random.seed(42)
     reduce_alberta_2024()
 
@@ -5,8 +5,16 @@ Reduce temp_grid_daily_2023_q1q2.csv by 50% while maintaining temporal and geogr
 
 import csv
 import os
-import random
-from collections import defaultdict
+
+import numpy as np
+
+from bin_sampling import rank_within_bins
+
+# Set random seed for reproducibility
+RANDOM_SEED = 42
+
+WRITE_BUFFER_SIZE = 1 << 20
+
 
 def reduce_q1q2_data():
     """Reduce q1q2 data by 50% with even spatial and temporal distribution."""
@@ -19,22 +27,32 @@ def reduce_q1q2_data():
     
     # Group data by spatial-temporal bins
     # Use rounded coordinates to create spatial bins
-    spatial_temporal_bins = defaultdict(list)  # {(lat_bin, lon_bin, date): [rows]}
+    spatial_temporal_bins = {}  # {(lat_bin, lon_bin, date): bin id}
+    
+    # Row fields are kept as flat columns alongside each row's bin id
+    dates, lats, lons, temps, row_bins = [], [], [], [], []
     
     with open(input_file, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
+        reader = csv.reader(infile)
+        header = next(reader)
+        date_idx, lat_idx, lon_idx = header.index('date'), header.index('lat'), header.index('lon')
+        temp_idx = header.index('temp_c')
         
         rows_read = 0
         for row in reader:
-            lat = float(row['lat'])
-            lon = float(row['lon'])
-            date = row['date']
+            lat = row[lat_idx]
+            lon = row[lon_idx]
+            date = row[date_idx]
             
             # Create spatial bins (round to 1 degree for spatial distribution)
-            lat_bin = round(lat, 0)  # 1 degree bins
-            lon_bin = round(lon, 0)
+            lat_bin = round(float(lat), 0)  # 1 degree bins
+            lon_bin = round(float(lon), 0)
             
-            spatial_temporal_bins[(lat_bin, lon_bin, date)].append(row)
+            row_bins.append(spatial_temporal_bins.setdefault((lat_bin, lon_bin, date), len(spatial_temporal_bins)))
+            dates.append(date)
+            lats.append(lat)
+            lons.append(lon)
+            temps.append(row[temp_idx])
             rows_read += 1
             
             if rows_read % 1000000 == 0:
@@ -50,31 +68,27 @@ def reduce_q1q2_data():
     # Sample from each bin proportionally to maintain distribution
     print("\nSampling data to maintain distribution...")
     
-    sampled_rows = []
-    rows_sampled = 0
-    
-    # Sample 50% from each spatial-temporal bin
-    for (lat_bin, lon_bin, date), rows in spatial_temporal_bins.items():
-        # Sample 50% from each bin to maintain distribution
-        num_to_sample = max(1, len(rows) // 2)  # At least 1 if bin has data
-        if len(rows) > 0:
-            sampled = random.sample(rows, min(num_to_sample, len(rows)))
-            sampled_rows.extend(sampled)
-            rows_sampled += len(sampled)
+    # Sample 50% from each spatial-temporal bin, at least 1 if bin has data
+    rng = np.random.default_rng(RANDOM_SEED)
+    row_bins = np.asarray(row_bins, dtype=np.int64)
+    ranks, bin_sizes = rank_within_bins(row_bins, rng)
+    num_to_sample = np.maximum(1, bin_sizes // 2)
+    sampled_rows = np.flatnonzero(ranks < num_to_sample[row_bins])
+    rows_sampled = len(sampled_rows)
     
     print(f"  Sampled {rows_sampled:,} rows from {len(spatial_temporal_bins):,} bins")
     
     # Shuffle to avoid any ordering bias
-    random.shuffle(sampled_rows)
+    rng.shuffle(sampled_rows)
     
     # Write sampled data
     print("\nWriting reduced dataset...")
-    with open(temp_output, 'w', encoding='utf-8', newline='') as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(['date', 'lat', 'lon', 'temp_c'])
+    with open(temp_output, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as outfile:
+        # Fields are plain dates and numbers, so rows need no CSV quoting
+        outfile.write('date,lat,lon,temp_c\n')
         
-        for row in sampled_rows:
-            writer.writerow([row['date'], row['lat'], row['lon'], row['temp_c']])
+        for i in sampled_rows.tolist():
+            outfile.write(f"{dates[i]},{lats[i]},{lons[i]},{temps[i]}\n")
     
     # Replace original with reduced file
     os.replace(temp_output, output_file)
@@ -86,7 +100,5 @@ def reduce_q1q2_data():
     print(f"  File updated: {output_file}")
 
 if __name__ == '__main__':
-    # Set random seed for reproducibility
-    random.seed(42)
     reduce_q1q2_data()
 
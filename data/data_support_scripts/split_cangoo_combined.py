@@ -1,54 +1,84 @@
 #!/usr/bin/env python3
 """
 Split cangoo_combined.json into two CSV files due to size limitations.
+Also writes the observations as a single dictionary-encoded Parquet file.
+cangoo_combined.json is read through the shared Parquet cache (see parquet_cache.py).
 """
 
-import json
 import csv
+from itertools import islice
 from pathlib import Path
 
+import pandas as pd
+
+from parquet_cache import load_combined_observations, object_values
+
+# Observation fields, in CSV column order
+OBSERVATION_FIELDS = ['lat', 'lon', 'date', 'count', 'comName', 'sciName', 'countryCode', 'stateCode', 'speciesCode']
+
+# Text columns repeated across observations, stored dictionary-encoded
+CATEGORY_COLUMNS = ['comName', 'sciName', 'countryCode', 'stateCode', 'speciesCode']
+
+# GitHub rejects files over this size; the Parquet file is committed to the repo
+MAX_FILE_SIZE_MB = 25
+
+# Buffer size for the CSV outputs
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def write_observations_parquet(df, output_file):
+    """Write observations to one zstd-compressed Parquet file and return its size in MB."""
+    df = df.copy()
+    for column in ('lat', 'lon', 'count'):
+        df[column] = pd.to_numeric(object_values(df[column]), errors='coerce')
+    # The "string" dtype keeps missing text as null instead of the text 'None'
+    df['date'] = df['date'].astype('string')
+    df[CATEGORY_COLUMNS] = df[CATEGORY_COLUMNS].astype('string').astype('category')
+    df.to_parquet(output_file, compression='zstd', index=False)
+    return output_file.stat().st_size / (1024 * 1024)
+
+
 def split_cangoo_combined():
     data_dir = Path(__file__).parent
     input_file = data_dir / 'cangoo_combined.json'
     output_file_1 = data_dir / 'cangoo_combined_part1.csv'
     output_file_2 = data_dir / 'cangoo_combined_part2.csv'
+    parquet_file = data_dir / 'cangoo_observations.parquet'
     
     print(f"Loading {input_file}...")
     
-    # Read the JSON file in chunks to handle large files
-    with open(input_file, 'r', encoding='utf-8') as f:
-        # Read the entire file (it's a single JSON object)
-        data = json.load(f)
+    df = load_combined_observations(input_file).reindex(columns=OBSERVATION_FIELDS)
     
-    observations = data.get('observations', [])
-    total_records = len(observations)
+    total_records = len(df)
     split_point = total_records // 2
     
     print(f"Total records: {total_records:,}")
     print(f"Splitting at record {split_point:,}")
     
-    # Define CSV columns
-    fieldnames = ['lat', 'lon', 'date', 'count', 'comName', 'sciName', 'countryCode', 'stateCode', 'speciesCode']
-    
-    # Write first half
-    print(f"Writing {output_file_1}...")
-    with open(output_file_1, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for obs in observations[:split_point]:
-            writer.writerow(obs)
-    
-    # Write second half
-    print(f"Writing {output_file_2}...")
-    with open(output_file_2, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for obs in observations[split_point:]:
-            writer.writerow(obs)
+    # Stream one row iterator into both files; the writer moves on to part 2
+    # once split_point rows have gone to part 1
+    rows = zip(*(object_values(df[name]).tolist() for name in OBSERVATION_FIELDS))
+    print(f"Writing {output_file_1} and {output_file_2}...")
+    with open(output_file_1, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f1, \
+            open(output_file_2, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f2:
+        for f, n_rows in ((f1, split_point), (f2, None)):
+            writer = csv.writer(f)
+            writer.writerow(OBSERVATION_FIELDS)
+            writer.writerows(islice(rows, n_rows))
+    
+    # Write all records as one Parquet file
+    print(f"Writing {parquet_file}...")
+    parquet_size_mb = write_observations_parquet(df, parquet_file)
     
     print(f"✓ Split complete!")
     print(f"  Part 1: {split_point:,} records")
     print(f"  Part 2: {total_records - split_point:,} records")
+    print(f"  Parquet: {parquet_size_mb:.1f} MB")
+    
+    if parquet_size_mb > MAX_FILE_SIZE_MB:
+        print(f"\n⚠️  Warning: {parquet_file.name} is over {MAX_FILE_SIZE_MB}MB - too large to commit to GitHub!")
+    else:
+        print(f"\n✅ {parquet_file.name} is under {MAX_FILE_SIZE_MB}MB - safe for GitHub!")
 
 if __name__ == '__main__':
     split_cangoo_combined()
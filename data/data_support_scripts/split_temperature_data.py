@@ -19,18 +19,33 @@ Output format: temp_chunk_YYYY-MM-A.json (A=first half) or temp_chunk_YYYY-MM-B.
         ...
     ]
 }
+
+Each chunk is also written gzip-compressed as temp_chunk_YYYY-MM-X.json.gz; the
+manifest lists it as gzFile and the globe fetches it when the browser can decompress it.
 """
 
-import json
-import csv
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from collections import defaultdict
 import shutil
 
+import numpy as np
+import orjson
+import pandas as pd
+
+# Decimal places kept in the chunk files; finer detail is invisible on the globe
+COORD_DIGITS = 2
+TEMP_DIGITS = 1
+
+# gzip level for the compressed chunk copies
+GZIP_LEVEL = 6
+
 def normalize_lon(lon):
-    """Normalize longitude to -180 to 180 range."""
-    lon = float(lon)
-    return ((lon + 180) % 360) - 180
+    """Normalize longitudes (an array) to -180 to 180 range."""
+    return np.mod(lon + 180, 360) - 180
 
 def get_period(date_str):
     """Return period key: YYYY-MM-A for days 1-15, YYYY-MM-B for days 16+"""
@@ -38,6 +53,55 @@ def get_period(date_str):
     month = date_str[:7]
     return f"{month}-A" if day <= 15 else f"{month}-B"
 
+def write_period(period, days_data, output_dir):
+    """
+    Write one biweekly chunk file and return its manifest entry.
+    days_data is a date-sorted list of (date, lats, lons, temps) arrays.
+    """
+    # Format for output
+    days = []
+    for date, lats, lons, temps in days_data:
+        days.append({
+            "date": date,
+            "points": [
+                {'lat': lat, 'lon': lon, 't': t}
+                for lat, lon, t in zip(lats.tolist(), lons.tolist(), temps.tolist())
+            ]
+        })
+    
+    start_date = days[0]["date"] if days else ""
+    end_date = days[-1]["date"] if days else ""
+    output_data = {
+        "period": period,
+        "startDate": start_date,
+        "endDate": end_date,
+        "days": days
+    }
+    
+    output_file = output_dir / f'temp_chunk_{period}.json'
+    gz_file = output_dir / f'temp_chunk_{period}.json.gz'
+    
+    data = orjson.dumps(output_data)
+    with open(output_file, 'wb') as f:
+        f.write(data)
+    # mtime=0 keeps the gzip bytes identical between runs on the same data
+    with open(gz_file, 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    
+    file_size = output_file.stat().st_size / (1024 * 1024)
+    gz_size = gz_file.stat().st_size / (1024 * 1024)
+    
+    return {
+        "period": period,
+        "file": f"temp_chunks/temp_chunk_{period}.json",
+        "gzFile": f"temp_chunks/temp_chunk_{period}.json.gz",
+        "startDate": start_date,
+        "endDate": end_date,
+        "days": len(days),
+        "sizeMB": round(file_size, 2),
+        "gzSizeMB": round(gz_size, 2)
+    }
+
 def main():
     data_dir = Path(__file__).parent.parent
     input_file = data_dir / 'temp_grid_daily_2023_2024.csv'
@@ -50,27 +114,32 @@ def main():
     
     print(f"Reading {input_file}...")
     
-    # Group data by biweekly period
-    period_data = defaultdict(lambda: defaultdict(list))
-    
-    row_count = 0
-    with open(input_file, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            date = row['date']
-            period = get_period(date)
-            
-            point = {
-                'lat': float(row['lat']),
-                'lon': normalize_lon(row['lon']),
-                't': float(row['temp_c'])
-            }
-            
-            period_data[period][date].append(point)
-            row_count += 1
-            
-            if row_count % 1000000 == 0:
-                print(f"  Processed {row_count:,} rows...")
+    # Load the columns once; round_trip parsing gives the same floats as float()
+    df = pd.read_csv(
+        input_file,
+        usecols=['date', 'lat', 'lon', 'temp_c'],
+        dtype={'date': str, 'lat': 'float64', 'lon': 'float64', 'temp_c': 'float64'},
+        float_precision='round_trip',
+    )
+    row_count = len(df)
+    
+    lats = np.round(df['lat'].to_numpy(), COORD_DIGITS)
+    lons = np.round(normalize_lon(df['lon'].to_numpy()), COORD_DIGITS)
+    temps = np.round(df['temp_c'].to_numpy(), TEMP_DIGITS)
+    
+    # Sort rows by date (stable, so rows keep their file order within a day)
+    # and find where each date's run starts and ends
+    dates, date_ids = np.unique(df['date'].to_numpy(), return_inverse=True)
+    order = np.argsort(date_ids, kind='stable')
+    lats, lons, temps = lats[order], lons[order], temps[order]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(date_ids, minlength=len(dates))))).tolist()
+    
+    # Group days by biweekly period; dates are sorted, so each period's days
+    # are in date order. The period only depends on the date, so it is
+    # computed once per distinct date
+    period_data = defaultdict(list)  # {period: [(date, lats, lons, temps)]}
+    for date, start, end in zip(dates.tolist(), bounds[:-1], bounds[1:]):
+        period_data[get_period(date)].append((date, lats[start:end], lons[start:end], temps[start:end]))
     
     print(f"Total rows: {row_count:,}")
     print(f"Found {len(period_data)} biweekly periods")
@@ -85,47 +154,20 @@ def main():
         }
     }
     
-    for period in sorted(period_data.keys()):
-        dates_data = period_data[period]
-        sorted_dates = sorted(dates_data.keys())
-        
-        # Format for output
-        days = []
-        for date in sorted_dates:
-            days.append({
-                "date": date,
-                "points": dates_data[date]
-            })
-        
-        output_data = {
-            "period": period,
-            "startDate": sorted_dates[0] if sorted_dates else "",
-            "endDate": sorted_dates[-1] if sorted_dates else "",
-            "days": days
-        }
-        
-        output_file = output_dir / f'temp_chunk_{period}.json'
-        
-        with open(output_file, 'w') as f:
-            json.dump(output_data, f, separators=(',', ':'))
-        
-        file_size = output_file.stat().st_size / (1024 * 1024)
-        
-        manifest["chunks"].append({
-            "period": period,
-            "file": f"temp_chunks/temp_chunk_{period}.json",
-            "startDate": sorted_dates[0] if sorted_dates else "",
-            "endDate": sorted_dates[-1] if sorted_dates else "",
-            "days": len(days),
-            "sizeMB": round(file_size, 2)
-        })
-        
-        print(f"  Wrote {output_file.name}: {len(days)} days, {file_size:.2f} MB")
+    # Each chunk only needs its own rows, so chunks are built and written in
+    # parallel worker processes; map() keeps the results in period order
+    periods = sorted(period_data.keys())
+    period_days = [period_data[period] for period in periods]
+    
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(periods) or 1)) as executor:
+        for entry in executor.map(write_period, periods, period_days, repeat(output_dir)):
+            manifest["chunks"].append(entry)
+            print(f"  Wrote temp_chunk_{entry['period']}.json: {entry['days']} days, {entry['sizeMB']:.2f} MB ({entry['gzSizeMB']:.2f} MB gzipped)")
     
     # Write manifest file
     manifest_file = data_dir / 'temp_chunks_manifest.json'
-    with open(manifest_file, 'w') as f:
-        json.dump(manifest, f, indent=2)
+    with open(manifest_file, 'wb') as f:
+        f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
     
     print(f"\nWrote manifest: {manifest_file}")
     print("\nDone! Biweekly temperature chunks created successfully.")
@@ -2,97 +2,100 @@
 """
 Update cangoo_averaged.json from cangoo_combined.json
 Properly handles the 'count' field in observations
+Reads cangoo_combined.json through the shared Parquet cache (see parquet_cache.py)
 """
 
-import json
+import math
 from pathlib import Path
-from collections import defaultdict
 
-def update_cangoo_averaged():
-    data_dir = Path(__file__).parent
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from parquet_cache import load_combined_observations, object_values
+
+def count_values(counts: pd.Series) -> np.ndarray:
+    """
+    Each observation's count: numbers as they are, and 1 for anything missing, negative
+    or not a number (numeric strings included), as the per-observation type check did.
+    """
+    if pd.api.types.is_numeric_dtype(counts) or pd.api.types.is_bool_dtype(counts):
+        values = counts.to_numpy(dtype=np.float64, na_value=np.nan)
+    elif counts.dtype == object:
+        # Mixed Python types; only int and float values are counts
+        values = np.array([v if isinstance(v, (int, float)) else np.nan for v in object_values(counts)],
+                          dtype=np.float64)
+    else:
+        values = np.full(len(counts), np.nan)  # Text only
+    return np.where(values >= 0, values, 1)
+
+def update_cangoo_averaged(data_dir: Path = Path(__file__).parent):
     input_file = data_dir / 'cangoo_combined.json'
     output_file = data_dir / 'cangoo_averaged.json'
     
     print(f"Processing {input_file}...")
     
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # One row per observation: date, count, lat, lon
+    df = load_combined_observations(input_file).reindex(columns=['date', 'count', 'lat', 'lon'])
+    print(f"  Loaded {len(df)} observations")
     
-    # Get observations from the combined JSON
-    observations = data.get('observations', [])
-    print(f"  Loaded {len(observations)} observations")
+    # Skip observations without a full YYYY-MM-DD date; the date checks and
+    # slices run as Arrow string kernels instead of per-row Python strings
+    dates = pc.cast(pa.array(object_values(df['date'])), pa.string())
+    has_date = pc.fill_null(pc.greater_equal(pc.utf8_length(dates), 10), False)
+    dates = dates.filter(has_date)
+    df = df[has_date.to_numpy(zero_copy_only=False)]
     
-    # Group by (year, day-of-year)
-    # Track: total count, all latitudes, all longitudes
-    year_day_data = defaultdict(lambda: {
-        'total_count': 0,
-        'lats': [],
-        'lons': []
+    # Group by (year, day-of-year); lat/lon values that don't parse are ignored
+    work = pd.DataFrame({
+        'year': pc.utf8_slice_codeunits(dates, 0, 4).to_pandas(),
+        'day': pc.utf8_slice_codeunits(dates, 5, 10).to_pandas(),  # MM-DD
+        'count': count_values(df['count']),
+        'lat': pd.to_numeric(object_values(df['lat']), errors='coerce'),
+        'lon': pd.to_numeric(object_values(df['lon']), errors='coerce'),
     })
     
-    for obs in observations:
-        date_str = obs.get('date', '')
-        if not date_str or len(date_str) < 10:
-            continue
-        
-        try:
-            year = date_str[:4]
-            day_of_year = date_str[5:10]  # MM-DD
-            
-            # Get count (default to 1 if missing)
-            count = obs.get('count', 1)
-            if not isinstance(count, (int, float)) or count < 0:
-                count = 1
-            
-            year_day_data[(year, day_of_year)]['total_count'] += count
-            
-            # Get latitude and longitude
-            lat = obs.get('lat')
-            lon = obs.get('lon')
-            
-            if lat is not None:
-                try:
-                    year_day_data[(year, day_of_year)]['lats'].append(float(lat))
-                except (ValueError, TypeError):
-                    pass
-            
-            if lon is not None:
-                try:
-                    year_day_data[(year, day_of_year)]['lons'].append(float(lon))
-                except (ValueError, TypeError):
-                    pass
-                    
-        except (IndexError, ValueError, KeyError):
-            continue
+    # (year, day) groups are numbered in order of first appearance, and every
+    # sum below adds in that group order and in row order within a group, the
+    # same left-to-right order as the per-group lists the averages replaced
+    groups = work.groupby(['year', 'day'], sort=False)
+    group_codes = groups.ngroup().to_numpy()
+    day_codes, days = pd.factorize(work['day'])
+    group_days = np.zeros(groups.ngroups, dtype=np.intp)
+    group_days[group_codes] = day_codes
     
-    # Now average across years for each day-of-year
-    day_averages = defaultdict(lambda: {
-        'counts': [],
-        'lats': [],
-        'lons': []
-    })
+    # Average count across years for each day-of-year
+    group_counts = np.zeros(groups.ngroups)
+    np.add.at(group_counts, group_codes, work['count'].to_numpy())
+    count_sums = np.zeros(len(days))
+    np.add.at(count_sums, group_days, group_counts)
+    avg_counts = count_sums / np.bincount(group_days, minlength=len(days))
     
-    for (year, day), data in year_day_data.items():
-        day_averages[day]['counts'].append(data['total_count'])
-        day_averages[day]['lats'].extend(data['lats'])
-        day_averages[day]['lons'].extend(data['lons'])
+    # Pool every latitude and longitude seen on that day
+    order = np.argsort(group_codes, kind='stable')
+    ordered_days = day_codes[order]
+    avg_coords = {}
+    for column in ('lat', 'lon'):
+        values = work[column].to_numpy(dtype=np.float64)[order]
+        present = ~np.isnan(values)
+        sums = np.zeros(len(days))
+        np.add.at(sums, ordered_days[present], values[present])
+        counts = np.bincount(ordered_days[present], minlength=len(days))
+        with np.errstate(invalid='ignore'):
+            avg_coords[column] = sums / counts
     
     # Calculate final averages
     result = {}
-    for day in sorted(day_averages.keys()):
-        counts = day_averages[day]['counts']
-        lats = day_averages[day]['lats']
-        lons = day_averages[day]['lons']
-        
-        # Average count across years
-        avg_count = sum(counts) / len(counts) if counts else 0
-        avg_lat = sum(lats) / len(lats) if lats else None
-        avg_lon = sum(lons) / len(lons) if lons else None
-        
+    for day in sorted(days):
+        i = days.get_loc(day)
+        avg_lat = avg_coords['lat'][i]
+        avg_lon = avg_coords['lon'][i]
         result[day] = {
-            'count': round(avg_count, 1),
-            'avgLat': round(avg_lat, 4) if avg_lat is not None else None,
-            'avgLon': round(avg_lon, 4) if avg_lon is not None else None
+            'count': round(float(avg_counts[i]), 1),
+            'avgLat': round(float(avg_lat), 4) if not math.isnan(avg_lat) else None,
+            'avgLon': round(float(avg_lon), 4) if not math.isnan(avg_lon) else None
         }
     
     print(f"  Generated {len(result)} daily averages")
@@ -105,8 +108,8 @@ def update_cangoo_averaged():
         'byDayOfYear': result
     }
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, separators=(',', ':'))
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(output_data))
     
     file_size_kb = output_file.stat().st_size / 1024
     print(f"✓ Wrote {output_file} ({file_size_kb:.1f} KB)")